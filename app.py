@@ -1,9 +1,10 @@
-from flask import Flask, render_template, request, jsonify, send_file
-from flask_socketio import SocketIO, emit
+from flask import Flask, Response, render_template, request, jsonify, send_file
+from flask_socketio import SocketIO, emit, join_room
 import os
 import threading
 import queue
 import json
+import time
 from datetime import datetime
 import uuid
 from nfo import (
@@ -11,11 +12,29 @@ from nfo import (
     download_video,
     download_subtitles,
     generate_metadata_files,
+    start_poster,
     check_ffmpeg_installed,
     update_ytdlp,
     update_ytdlp_nightly,
-    get_current_ytdlp_version
+    get_current_ytdlp_version,
+    is_collection_url,
+    iter_new_videos,
+    get_download_archive,
+    ARCHIVE_FILENAME,
+    VideoInfo,
+    parse_video_id,
+    normalize_connections,
+    format_throughput
 )
+from scheduler import DownloadScheduler
+from journal import JobJournal
+from manifest import write_manifest
+from catalog import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, find_downloaded, get_catalog
+from cookie_store import store_upload, evict_stale_uploads
+from ratelimit import limiter_snapshots
+import metrics
+from emby import get_emby_notifier
+from profiling import JobTrace, current_trace, use_trace, profile_job, profile_path, top_functions
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
@@ -23,6 +42,66 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 
 # 存储活动的下载任务
 active_downloads = {}
+# 可重入：状态检查与推送在同一把锁内完成，推送时还会读取任务的会话列表
+active_downloads_lock = threading.RLock()
+# 进行中的任务：(视频ID, 输出目录绝对路径) -> task_id，重复提交的同一视频合并到已有任务
+inflight_tasks = {}
+
+# 已结束任务的保留策略：最多保留的条数与保留时长（秒）
+FINISHED_JOB_HISTORY = int(os.environ.get('YT2EMBY_JOB_HISTORY', '200'))
+FINISHED_JOB_TTL = int(os.environ.get('YT2EMBY_JOB_TTL', '3600'))
+FINISHED_STATUSES = ('completed', 'error')
+
+# 持久化任务日志：重启后恢复未完成的任务
+job_journal = JobJournal()
+
+# 上传的cookie文件保存目录与保留时长（秒），按内容去重，超过保留时长未使用的会被清理
+COOKIE_UPLOAD_DIR = os.path.join(os.path.dirname(__file__), 'temp')
+COOKIE_UPLOAD_TTL = int(os.environ.get('YT2EMBY_COOKIE_TTL', str(7 * 24 * 3600)))
+
+# 下载调度配置（可通过环境变量调整）
+MAX_CONCURRENT_JOBS = int(os.environ.get('YT2EMBY_MAX_JOBS', '3'))
+MAX_NETWORK_DOWNLOADS = int(os.environ.get('YT2EMBY_MAX_NETWORK', '2'))
+MAX_FFMPEG_MERGES = int(os.environ.get('YT2EMBY_MAX_MERGES', '1'))
+# 多连接下载的默认值（请求中可用 connections / parallel_streams 覆盖）
+DEFAULT_CONNECTIONS = normalize_connections(os.environ.get('YT2EMBY_CONNECTIONS', '1'))
+DEFAULT_PARALLEL_STREAMS = os.environ.get('YT2EMBY_PARALLEL_STREAMS', '0').lower() in ('1', 'true', 'yes')
+# 是否默认记录每个任务各阶段的耗时（请求中可用 trace 覆盖）
+DEFAULT_TRACE_JOBS = os.environ.get('YT2EMBY_TRACE_JOBS', '0').lower() in ('1', 'true', 'yes')
+
+# 日志批量推送间隔（秒）
+LOG_FLUSH_INTERVAL = 0.2
+
+class LogBatcher:
+    """按会话缓冲日志，每隔 LOG_FLUSH_INTERVAL 秒向对应会话房间批量推送一次"""
+    def __init__(self, interval=LOG_FLUSH_INTERVAL):
+        self.interval = interval
+        self._buffers = {}
+        self._lock = threading.Lock()
+        self._started = False
+    
+    def add(self, session_id, message):
+        with self._lock:
+            self._buffers.setdefault(session_id, []).append(message)
+            if not self._started:
+                self._started = True
+                socketio.start_background_task(self._run)
+    
+    def flush(self):
+        with self._lock:
+            buffers, self._buffers = self._buffers, {}
+        for session_id, messages in buffers.items():
+            socketio.emit('log_batch', {
+                'messages': messages,
+                'session_id': session_id
+            }, to=session_id)
+    
+    def _run(self):
+        while True:
+            socketio.sleep(self.interval)
+            self.flush()
+
+log_batcher = LogBatcher()
 
 class WebLogger:
     """Web版本的日志记录器，通过WebSocket发送日志"""
@@ -30,12 +109,457 @@ class WebLogger:
         self.session_id = session_id
     
     def log(self, message):
-        """发送日志消息到前端"""
+        """发送日志消息到前端（批量推送到该会话的房间）"""
         timestamp = datetime.now().strftime("%H:%M:%S")
-        socketio.emit('log_message', {
-            'message': f"[{timestamp}] {message}",
-            'session_id': self.session_id
-        })
+        log_batcher.add(self.session_id, f"[{timestamp}] {message}")
+
+class TaskLogger:
+    """下载任务的日志记录器，推送给所有关注该任务的会话（包括之后合并进来的会话）"""
+    def __init__(self, task_id):
+        self.task_id = task_id
+    
+    def log(self, message):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        for session_id in task_sessions(self.task_id):
+            log_batcher.add(session_id, f"[{timestamp}] {message}")
+
+def task_sessions(task_id):
+    """返回关注该任务的会话列表"""
+    with active_downloads_lock:
+        task = active_downloads.get(task_id)
+        return list(task['session_ids']) if task else []
+
+def emit_to_task_sessions(event, task_id, payload):
+    """向关注该任务的每个会话推送事件（payload 中的 session_id 为接收方会话）"""
+    for session_id in task_sessions(task_id):
+        socketio.emit(event, dict(payload, session_id=session_id), to=session_id)
+
+def emit_download_status(task_id, status, message, **extra):
+    """更新任务状态并通过WebSocket通知前端
+
+    只有状态真正变化时才写入任务日志；排队位置等同一状态下的刷新只保存在内存中。
+    """
+    payload = {
+        'task_id': task_id,
+        'status': status,
+        'message': message
+    }
+    payload.update(extra)
+    # 状态修改与推送在锁内完成，排队位置的刷新不会把已开始的任务改回 'queued'
+    with active_downloads_lock:
+        task = active_downloads[task_id]
+        changed = task['status'] != status
+        task['status'] = status
+        if status != 'queued':
+            task['queue_position'] = 0
+        if status in FINISHED_STATUSES:
+            task['finished_at'] = time.time()
+            # 任务结束后同一视频可以重新提交
+            if inflight_tasks.get(task.get('inflight_key')) == task_id:
+                del inflight_tasks[task['inflight_key']]
+        emit_to_task_sessions('download_status', task_id, payload)
+    if changed:
+        job_journal.update_status(task_id, status)
+    if status in FINISHED_STATUSES:
+        prune_finished_downloads()
+
+def emit_download_progress(task_id, record):
+    """记录下载进度并推送给前端（调用频率已由 ProgressReporter 限流）"""
+    task = active_downloads.get(task_id)
+    if task is None:
+        return
+    if record.get('percent') is not None:
+        task['progress'] = record['percent']
+    task['download'] = record
+    emit_to_task_sessions('download_progress', task_id, dict(record, task_id=task_id))
+
+def prune_finished_downloads():
+    """淘汰过期或超出历史条数上限的已结束任务，避免长时间运行时内存持续增长"""
+    now = time.time()
+    with active_downloads_lock:
+        finished = sorted(
+            (task.get('finished_at', now), task_id)
+            for task_id, task in list(active_downloads.items())
+            if task['status'] in FINISHED_STATUSES
+        )
+        excess = len(finished) - FINISHED_JOB_HISTORY
+        for index, (finished_at, task_id) in enumerate(finished):
+            if index < excess or now - finished_at > FINISHED_JOB_TTL:
+                task = active_downloads.pop(task_id, None)
+                if task and task.get('profile'):
+                    try:
+                        os.remove(profile_path(task_id))
+                    except OSError:
+                        pass
+
+# 监控指标（/metrics 导出）
+ACTIVE_STAGES = ('getting_info', 'downloading_video', 'downloading_subtitles', 'generating_metadata')
+STAGE_SECONDS = metrics.histogram('yt2emby_stage_duration_seconds', '任务各阶段的耗时（秒，含等待调度槽位）', ('stage',))
+QUEUE_WAIT_SECONDS = metrics.histogram('yt2emby_queue_wait_seconds', '任务从加入队列到开始执行的等待时间（秒）')
+JOBS_FINISHED = metrics.counter('yt2emby_jobs_total', '已结束的任务数', ('status',))
+DUPLICATE_REQUESTS = metrics.counter('yt2emby_duplicate_requests_total', '合并到进行中任务的重复下载请求数')
+QUEUE_DEPTH = metrics.gauge('yt2emby_queue_depth', '等待执行的任务数')
+RUNNING_JOBS = metrics.gauge('yt2emby_running_jobs', '正在执行的任务数')
+ACTIVE_JOBS = metrics.gauge('yt2emby_active_jobs', '处于各阶段的任务数', ('stage',))
+REQUEST_RATE = metrics.gauge('yt2emby_request_rate', '自适应限速器的当前速率（请求/秒）', ('host', 'account'))
+THROTTLED_RESPONSES = metrics.counter('yt2emby_throttled_responses_total', '被限流（429/403/人机验证）的请求数',
+                                      ('host', 'account'))
+
+def _count_active_stages():
+    with active_downloads_lock:
+        statuses = [task['status'] for task in active_downloads.values()]
+    return {(stage,): statuses.count(stage) for stage in ACTIVE_STAGES}
+
+def _limiter_values(field):
+    return {
+        (host, os.path.basename(account)): snapshot[field]
+        for (host, account), snapshot in limiter_snapshots().items()
+    }
+
+ACTIVE_JOBS.set_function(_count_active_stages)
+REQUEST_RATE.set_function(lambda: _limiter_values('rate'))
+THROTTLED_RESPONSES.set_function(lambda: _limiter_values('throttled'))
+
+# 排队位置推送的最小间隔（秒）：连续出队时合并为一次刷新
+QUEUE_POSITION_INTERVAL = 0.5
+
+def refresh_queue_positions():
+    """按调度器当前的等待队列刷新排队任务的位置，只推送位置有变化的任务"""
+    for index, task_id in enumerate(scheduler.pending_ids()):
+        with active_downloads_lock:
+            task = active_downloads.get(task_id)
+            if not task or task['status'] != 'queued' or task.get('queue_position') == index + 1:
+                continue
+            task['queue_position'] = index + 1
+            emit_to_task_sessions('download_status', task_id, {
+                'task_id': task_id,
+                'status': 'queued',
+                'message': f'已加入队列，前方还有 {index} 个任务',
+                'queue_position': index + 1
+            })
+
+class QueuePositionNotifier:
+    """在后台线程中合并刷新排队位置；调度器出队时只做标记，不阻塞任务开始执行"""
+    def __init__(self, interval=QUEUE_POSITION_INTERVAL):
+        self.interval = interval
+        self._event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def mark(self):
+        self._event.set()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='queue-positions', daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            self._event.wait()
+            self._event.clear()
+            try:
+                refresh_queue_positions()
+            except Exception as e:
+                print(f"⚠️ 刷新排队位置失败: {e}")
+            time.sleep(self.interval)
+
+queue_notifier = QueuePositionNotifier()
+
+# 下载任务调度器：限制同时运行的任务数以及网络下载/ffmpeg合并的并发数
+scheduler = DownloadScheduler(
+    max_workers=MAX_CONCURRENT_JOBS,
+    stage_limits={'network': MAX_NETWORK_DOWNLOADS, 'merge': MAX_FFMPEG_MERGES},
+    on_queue_change=queue_notifier.mark
+)
+QUEUE_DEPTH.set_function(lambda: scheduler.pending_count)
+RUNNING_JOBS.set_function(lambda: scheduler.running_count)
+
+def record_job_timings(task_id, logger):
+    """把当前线程 trace 中的各阶段耗时写入任务记录与日志（未启用 trace 时不做任何事）"""
+    job_trace = current_trace()
+    if job_trace is None:
+        return
+    active_downloads[task_id]['timings'] = job_trace.to_dict()
+    logger.log("各阶段耗时: " + "；".join(job_trace.format_lines()))
+
+def run_download_job(task_id, url, output_dir, cookie_file, video_format, session_id,
+                     archive_path=None, resume=None, connections=DEFAULT_CONNECTIONS,
+                     parallel_streams=DEFAULT_PARALLEL_STREAMS, trace=DEFAULT_TRACE_JOBS, profile=False,
+                     force=False):
+    """在调度器的工作线程中执行一个下载任务
+
+    trace 为 True 时记录各阶段耗时；profile 为 True 时同时用 cProfile 采集该任务，
+    结果可通过 /api/download_profile/<task_id> 下载。
+    """
+    args = (task_id, url, output_dir, cookie_file, video_format, session_id,
+            archive_path, resume, connections, parallel_streams, force)
+    with use_trace(JobTrace() if trace or profile else None):
+        if not profile:
+            _run_download_job(*args)
+            return
+        logger = TaskLogger(task_id)
+        with profile_job(task_id) as path:
+            if path is None:
+                logger.log("已有任务正在进行性能分析，本任务只记录各阶段耗时")
+            _run_download_job(*args)
+    if path:
+        active_downloads[task_id]['profile'] = f'/api/download_profile/{task_id}'
+        logger.log(f"性能分析已保存，下载地址: /api/download_profile/{task_id}\n{top_functions(path)}")
+
+def _run_download_job(task_id, url, output_dir, cookie_file, video_format, session_id,
+                      archive_path, resume, connections, parallel_streams, force):
+    """执行下载任务的各个阶段
+
+    resume 为任务日志中记录的进度，已完成的阶段会被跳过；
+    视频阶段未完成时 yt-dlp 会沿用输出目录中的 .part 文件继续下载。
+    媒体库中已有的视频直接完成，不发起网络请求；force 为 True 时重新下载。
+    """
+    logger = TaskLogger(task_id)
+    QUEUE_WAIT_SECONDS.observe(time.monotonic() - active_downloads[task_id]['queued_at'])
+    completed_stages = set(resume['completed_stages']) if resume else set()
+    state = resume['state'] if resume else {}
+    job_started = time.monotonic()
+    video_info = None
+    try:
+        if not resume and not force:
+            item = find_downloaded(output_dir, parse_video_id(url))
+            if item:
+                logger.log(f"媒体库中已有该视频，跳过下载: {item['video_path']}")
+                record_job_timings(task_id, logger)
+                emit_download_status(task_id, 'completed', '已下载（媒体库中已有）',
+                                     output_dir=item['folder'], skipped=True)
+                JOBS_FINISHED.inc(status='skipped')
+                return
+
+        if 'info' in completed_stages:
+            video_info = VideoInfo.from_dict(state['info'])
+            video_info.artifacts = state.get('artifacts', {})
+            final_output_dir = state['final_output_dir']
+            logger.log(f"恢复任务: {video_info.title}（已完成阶段: {', '.join(sorted(completed_stages))}）")
+        else:
+            emit_download_status(task_id, 'getting_info', '正在获取视频信息...')
+            logger.log("正在获取视频信息...")
+            with STAGE_SECONDS.time(stage='info'), scheduler.stage('network'):
+                video_info = get_video_info(url, cookie_file if cookie_file else None)
+            
+            if not video_info:
+                raise Exception("获取视频信息失败")
+            
+            # 创建输出目录
+            final_output_dir = os.path.join(output_dir, video_info['title'])
+            os.makedirs(final_output_dir, exist_ok=True)
+            logger.log(f"创建输出目录: {final_output_dir}")
+            job_journal.complete_stage(task_id, 'info', info=video_info.to_dict(),
+                                       final_output_dir=final_output_dir)
+        
+        # 海报在独立线程池中与视频下载并行处理，生成元数据时再取结果
+        poster = start_poster(video_info, final_output_dir)
+        video_info['cookiefile'] = cookie_file if cookie_file else None
+        video_info['video_format'] = video_format
+        video_info['connections'] = connections
+        video_info['parallel_streams'] = parallel_streams
+        
+        # 下载视频（合并阶段由 hook 切换到 ffmpeg 合并槽位）
+        if 'video' not in completed_stages:
+            emit_download_status(task_id, 'downloading_video', '正在下载视频...')
+            logger.log("开始下载视频...")
+            with STAGE_SECONDS.time(stage='video'), scheduler.stage('network') as slot:
+                video_filename = download_video(
+                    video_info, final_output_dir,
+                    postprocessor_hooks=[slot.ytdlp_postprocessor_hook],
+                    progress_callback=lambda record: emit_download_progress(task_id, record)
+                )
+            
+            if not video_filename:
+                raise Exception("视频下载失败")
+            if video_info.download_stats:
+                active_downloads[task_id]['download_stats'] = video_info.download_stats
+                logger.log(f"下载吞吐: {format_throughput(video_info.download_stats)}")
+            job_journal.complete_stage(task_id, 'video', video_filename=video_filename,
+                                       artifacts=video_info.artifacts,
+                                       download_stats=video_info.download_stats)
+        
+        # 下载字幕
+        if 'subtitles' not in completed_stages:
+            emit_download_status(task_id, 'downloading_subtitles', '正在下载字幕...')
+            logger.log("开始下载字幕...")
+            with STAGE_SECONDS.time(stage='subtitles'), scheduler.stage('network'):
+                download_subtitles(video_info, final_output_dir)
+            job_journal.complete_stage(task_id, 'subtitles', artifacts=video_info.artifacts)
+        
+        # 生成元数据
+        emit_download_status(task_id, 'generating_metadata', '正在生成元数据文件...')
+        logger.log("生成元数据文件...")
+        with STAGE_SECONDS.time(stage='metadata'):
+            generate_metadata_files(video_info, final_output_dir, poster)
+        job_journal.complete_stage(task_id, 'metadata', artifacts=video_info.artifacts)
+        try:
+            manifest_path = write_manifest(output_dir, video_info, video_info.artifacts)
+            logger.log(f"任务清单已写入: {manifest_path}")
+        except Exception as e:
+            logger.log(f"写入任务清单失败: {e}")
+        try:
+            get_catalog().add(output_dir, video_info.to_dict(), video_info.artifacts)
+        except Exception as e:
+            logger.log(f"登记到媒体库目录失败: {e}")
+        emby = get_emby_notifier()
+        if emby:
+            emby.notify(final_output_dir)
+            logger.log("已加入 Emby 定向刷新队列")
+        
+        # 完成
+        elapsed = time.monotonic() - job_started
+        saved = video_info.get('reuse_saved_seconds', 0.0)
+        active_downloads[task_id]['elapsed_seconds'] = round(elapsed, 2)
+        active_downloads[task_id]['reuse_saved_seconds'] = round(saved, 2)
+        if archive_path:
+            get_download_archive(archive_path).add(video_info.video_id)
+        record_job_timings(task_id, logger)
+        emit_download_status(task_id, 'completed', '下载完成！', output_dir=final_output_dir,
+                             download_stats=video_info.download_stats or state.get('download_stats'))
+        JOBS_FINISHED.inc(status='completed')
+        logger.log(f"下载完成！用时 {elapsed:.1f}s，复用视频信息约节省 {saved:.1f}s")
+        
+    except Exception as e:
+        error_msg = str(e)
+        logger.log(f"发生错误: {error_msg}")
+        record_job_timings(task_id, logger)
+        emit_download_status(task_id, 'error', f'错误: {error_msg}')
+        JOBS_FINISHED.inc(status='error')
+    finally:
+        # 任务结束后释放原始视频信息
+        if video_info:
+            video_info.release()
+
+def inflight_key(url, output_dir):
+    """单飞合并的键：(视频ID, 输出目录绝对路径)，无法解析视频ID时返回None（不合并）"""
+    video_id = parse_video_id(url)
+    return (video_id, os.path.abspath(output_dir)) if video_id else None
+
+def attach_download(task_id, session_id):
+    """把会话合并到进行中的任务，并推送任务的当前状态"""
+    task = active_downloads[task_id]
+    payload = {
+        'task_id': task_id,
+        'status': task['status'],
+        'message': '相同的视频正在下载，已合并到进行中的任务',
+        'session_id': session_id,
+        'queue_position': task.get('queue_position', 0),
+        'attached': True
+    }
+    socketio.emit('download_status', payload, to=session_id)
+    if task.get('download'):
+        socketio.emit('download_progress', dict(task['download'], task_id=task_id, session_id=session_id),
+                      to=session_id)
+    WebLogger(session_id).log(f"相同的视频已在下载中，合并到任务 {task_id}")
+
+def enqueue_download(task_id, url, output_dir, cookie_file, video_format, session_id,
+                     archive_path=None, resume=None, connections=DEFAULT_CONNECTIONS,
+                     parallel_streams=DEFAULT_PARALLEL_STREAMS, trace=DEFAULT_TRACE_JOBS, profile=False,
+                     force=False):
+    """登记任务并提交到调度器，返回 (任务ID, 排队位置, 是否合并到已有任务)
+
+    同一视频下载到同一输出目录的任务进行中时不创建新任务，而是把会话加入已有任务，
+    返回已有任务的ID，之后的状态、进度与日志同时推送给这些会话。
+    """
+    prune_finished_downloads()
+    key = inflight_key(url, output_dir)
+    with active_downloads_lock:
+        existing = inflight_tasks.get(key) if key else None
+        if existing is not None:
+            session_ids = active_downloads[existing]['session_ids']
+            if session_id not in session_ids:
+                session_ids.append(session_id)
+            position = active_downloads[existing].get('queue_position', 0)
+        else:
+            active_downloads[task_id] = {
+                'status': 'queued',
+                'progress': 0,
+                'session_id': session_id,
+                'session_ids': [session_id],
+                'inflight_key': key,
+                'queue_position': 0,
+                'queued_at': time.monotonic()
+            }
+            if key:
+                inflight_tasks[key] = task_id
+    if existing is not None:
+        DUPLICATE_REQUESTS.inc()
+        if resume is not None:
+            # 重启前重复登记的任务：由已有任务完成，日志中不再保留为未完成
+            job_journal.update_status(task_id, 'merged')
+        attach_download(existing, session_id)
+        return existing, position, True
+    if resume is None:
+        job_journal.record_job(
+            task_id, url=url, output_dir=output_dir, cookie_file=cookie_file,
+            video_format=video_format, session_id=session_id, archive_path=archive_path,
+            connections=connections, parallel_streams=parallel_streams, trace=trace, profile=profile,
+            force=force
+        )
+    
+    # 提交后空闲的工作线程可能立即开始执行，'queued' 状态必须在提交前发出，
+    # 否则会覆盖任务之后的状态（包括已结束的状态）
+    position = scheduler.pending_count + 1
+    with active_downloads_lock:
+        active_downloads[task_id]['queue_position'] = position
+        emit_download_status(task_id, 'queued', f'已加入队列，前方还有 {position - 1} 个任务',
+                             queue_position=position)
+    submitted_position = scheduler.submit(
+        task_id, run_download_job,
+        task_id, url, output_dir, cookie_file, video_format, session_id, archive_path, resume,
+        connections, parallel_streams, trace, profile, force
+    )
+    if submitted_position != position:
+        # 同时有其他任务提交，位置由后台刷新更正
+        queue_notifier.mark()
+    return task_id, submitted_position, False
+
+def evict_unused_cookie_uploads():
+    """清理长期未使用的上传cookie文件，未完成任务引用的文件保留"""
+    in_use = [job['params'].get('cookie_file') for job in job_journal.unfinished()]
+    removed = evict_stale_uploads(COOKIE_UPLOAD_DIR, COOKIE_UPLOAD_TTL, keep=in_use)
+    if removed:
+        print(f"🧹 已清理 {removed} 个过期的cookie文件")
+
+def resume_unfinished_jobs():
+    """服务启动时把任务日志中未完成的任务重新排队"""
+    job_journal.prune()
+    jobs = job_journal.unfinished()
+    for job in jobs:
+        params = job['params']
+        enqueue_download(
+            job['task_id'], params['url'], params['output_dir'], params['cookie_file'],
+            params['video_format'], params['session_id'], params.get('archive_path'), resume=job,
+            connections=params.get('connections', DEFAULT_CONNECTIONS),
+            parallel_streams=params.get('parallel_streams', DEFAULT_PARALLEL_STREAMS),
+            trace=params.get('trace', DEFAULT_TRACE_JOBS),
+            profile=params.get('profile', False),
+            force=params.get('force', False)
+        )
+    if jobs:
+        print(f"已恢复 {len(jobs)} 个未完成的下载任务")
+    return len(jobs)
+
+def run_sync(url, output_dir, cookie_file, video_format, session_id,
+             connections=DEFAULT_CONNECTIONS, parallel_streams=DEFAULT_PARALLEL_STREAMS,
+             trace=DEFAULT_TRACE_JOBS):
+    """列举频道/播放列表，只为归档中没有的视频创建下载任务"""
+    logger = WebLogger(session_id)
+    archive_path = os.path.join(output_dir, ARCHIVE_FILENAME)
+    try:
+        archive = get_download_archive(archive_path)
+        logger.log(f"开始同步: {url}（已归档 {len(archive)} 个视频）")
+        queued = 0
+        for video_url in iter_new_videos(url, archive, cookie_file if cookie_file else None):
+            _, _, attached = enqueue_download(str(uuid.uuid4()), video_url, output_dir, cookie_file,
+                                              video_format, session_id, archive_path,
+                                              connections=connections, parallel_streams=parallel_streams,
+                                              trace=trace)
+            queued += not attached
+        logger.log(f"同步列举完成，新增下载任务 {queued} 个")
+    except Exception as e:
+        logger.log(f"同步失败: {str(e)}")
 
 @app.route('/')
 def index():
@@ -49,11 +573,9 @@ def check_ffmpeg():
 
 @app.route('/api/ytdlp_info')
 def get_ytdlp_info():
-    """获取yt-dlp版本信息"""
+    """获取yt-dlp版本信息（版本号缓存在进程内，响应支持ETag条件请求）"""
     try:
-        print("API: 开始获取yt-dlp版本信息")
         current_version = get_current_ytdlp_version()
-        print(f"API: 获取到版本: {current_version}")
         
         if current_version == "未安装":
             status = "未安装 - 请运行 pip install --pre yt-dlp"
@@ -66,9 +588,12 @@ def get_ytdlp_info():
             'current': current_version,
             'status': status
         }
-        print(f"API: 返回结果: {result}")
         
-        return jsonify(result)
+        response = jsonify(result)
+        # 浏览器每次使用前向服务器确认，版本未变化时返回304
+        response.headers['Cache-Control'] = 'no-cache'
+        response.set_etag(f"ytdlp-{current_version}")
+        return response.make_conditional(request)
     except Exception as e:
         print(f"API: 发生错误: {e}")
         return jsonify({'error': str(e)}), 500
@@ -95,20 +620,20 @@ def update_ytdlp_api():
                     'success': True,
                     'new_version': new_version,
                     'session_id': session_id
-                })
+                }, to=session_id)
             else:
                 logger.log("yt-dlp更新失败！")
                 socketio.emit('update_complete', {
                     'success': False,
                     'session_id': session_id
-                })
+                }, to=session_id)
         except Exception as e:
             logger.log(f"更新过程中出错: {str(e)}")
             socketio.emit('update_complete', {
                 'success': False,
                 'error': str(e),
                 'session_id': session_id
-            })
+            }, to=session_id)
     
     thread = threading.Thread(target=update_process)
     thread.daemon = True
@@ -127,19 +652,15 @@ def upload_cookie():
         if file.filename == '':
             return jsonify({'error': '没有选择文件'}), 400
         
-        # 创建临时目录存储Cookie文件
-        temp_dir = os.path.join(os.path.dirname(__file__), 'temp')
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # 保存文件
-        filename = f"cookies_{uuid.uuid4().hex[:8]}.txt"
-        filepath = os.path.join(temp_dir, filename)
-        file.save(filepath)
+        # 按内容哈希保存，同一账号重复上传时复用已有文件（及其中已刷新的会话cookie）
+        filepath, reused = store_upload(file.read(), COOKIE_UPLOAD_DIR)
+        evict_unused_cookie_uploads()
         
         return jsonify({
             'success': True,
             'filepath': filepath,
-            'filename': filename
+            'filename': os.path.basename(filepath),
+            'reused': reused
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -153,6 +674,11 @@ def start_download():
     output_dir = data.get('output_dir', './downloads').strip()
     cookie_file = data.get('cookie_file', '').strip()
     video_format = data.get('video_format', 'mp4')
+    connections = normalize_connections(data.get('connections', DEFAULT_CONNECTIONS))
+    parallel_streams = bool(data.get('parallel_streams', DEFAULT_PARALLEL_STREAMS))
+    trace = bool(data.get('trace', DEFAULT_TRACE_JOBS))
+    profile = bool(data.get('profile', False))
+    force = bool(data.get('force', False))
     
     # 验证输入
     if not url:
@@ -168,116 +694,41 @@ def start_download():
             else:
                 return jsonify({'error': 'Cookie文件不存在'}), 400
     
+    # 频道/播放列表链接：后台列举并只为新视频创建下载任务
+    if is_collection_url(url):
+        session_id = data.get('session_id', str(uuid.uuid4()))
+        thread = threading.Thread(
+            target=run_sync,
+            args=(url, output_dir, cookie_file, video_format, session_id, connections, parallel_streams, trace),
+            daemon=True
+        )
+        thread.start()
+        return jsonify({'session_id': session_id, 'status': 'syncing'})
+    
+    # 媒体库中已有的视频直接返回，不排队也不发起网络请求（force 为 True 时重新下载）
+    item = None if force else find_downloaded(output_dir, parse_video_id(url))
+    if item:
+        return jsonify({
+            'session_id': data.get('session_id'),
+            'status': 'exists',
+            'item': item
+        })
+    
     # 生成任务ID
     task_id = str(uuid.uuid4())
     session_id = data.get('session_id', task_id)
-    
-    # 创建日志记录器
-    logger = WebLogger(session_id)
-    
-    # 存储任务信息
-    active_downloads[task_id] = {
-        'status': 'starting',
-        'progress': 0,
-        'session_id': session_id
-    }
-    
-    def download_process():
-        try:
-            # 更新任务状态
-            active_downloads[task_id]['status'] = 'getting_info'
-            socketio.emit('download_status', {
-                'task_id': task_id,
-                'status': 'getting_info',
-                'message': '正在获取视频信息...',
-                'session_id': session_id
-            })
-            
-            logger.log("正在获取视频信息...")
-            video_info = get_video_info(url, cookie_file if cookie_file else None)
-            
-            if not video_info:
-                raise Exception("获取视频信息失败")
-            
-            video_info['cookiefile'] = cookie_file if cookie_file else None
-            video_info['video_format'] = video_format
-            
-            # 创建输出目录
-            final_output_dir = os.path.join(output_dir, video_info['title'])
-            os.makedirs(final_output_dir, exist_ok=True)
-            logger.log(f"创建输出目录: {final_output_dir}")
-            
-            # 下载视频
-            active_downloads[task_id]['status'] = 'downloading_video'
-            socketio.emit('download_status', {
-                'task_id': task_id,
-                'status': 'downloading_video',
-                'message': '正在下载视频...',
-                'session_id': session_id
-            })
-            
-            logger.log("开始下载视频...")
-            video_filename = download_video(video_info, final_output_dir)
-            
-            if not video_filename:
-                raise Exception("视频下载失败")
-            
-            # 下载字幕
-            active_downloads[task_id]['status'] = 'downloading_subtitles'
-            socketio.emit('download_status', {
-                'task_id': task_id,
-                'status': 'downloading_subtitles',
-                'message': '正在下载字幕...',
-                'session_id': session_id
-            })
-            
-            logger.log("开始下载字幕...")
-            download_subtitles(video_info, final_output_dir)
-            
-            # 生成元数据
-            active_downloads[task_id]['status'] = 'generating_metadata'
-            socketio.emit('download_status', {
-                'task_id': task_id,
-                'status': 'generating_metadata',
-                'message': '正在生成元数据文件...',
-                'session_id': session_id
-            })
-            
-            logger.log("生成元数据文件...")
-            generate_metadata_files(video_info, final_output_dir)
-            
-            # 完成
-            active_downloads[task_id]['status'] = 'completed'
-            socketio.emit('download_status', {
-                'task_id': task_id,
-                'status': 'completed',
-                'message': '下载完成！',
-                'output_dir': final_output_dir,
-                'session_id': session_id
-            })
-            
-            logger.log("下载完成！")
-            
-        except Exception as e:
-            error_msg = str(e)
-            logger.log(f"发生错误: {error_msg}")
-            active_downloads[task_id]['status'] = 'error'
-            socketio.emit('download_status', {
-                'task_id': task_id,
-                'status': 'error',
-                'message': f'错误: {error_msg}',
-                'session_id': session_id
-            })
-    
-    # 启动下载线程
-    thread = threading.Thread(target=download_process)
-    thread.daemon = True
-    thread.start()
+    task_id, position, attached = enqueue_download(
+        task_id, url, output_dir, cookie_file, video_format, session_id,
+        connections=connections, parallel_streams=parallel_streams, trace=trace, profile=profile,
+        force=force
+    )
     
     return jsonify({
         'task_id': task_id,
         'session_id': session_id,
-        'status': 'started'
+        'status': active_downloads[task_id]['status'] if attached else 'queued',
+        'queue_position': position,
+        'attached': attached
     })
 
 @app.route('/api/download_status/<task_id>')
@@ -288,11 +739,62 @@ def get_download_status(task_id):
     else:
         return jsonify({'error': '任务不存在'}), 404
 
+@app.route('/api/library')
+def list_library():
+    """分页查询媒体库目录（page / per_page / uploader / output_dir / q）"""
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(MAX_PAGE_SIZE, max(1, int(request.args.get('per_page', DEFAULT_PAGE_SIZE))))
+    except ValueError:
+        return jsonify({'error': 'page / per_page 必须是整数'}), 400
+    items, total = get_catalog().query(
+        page, per_page,
+        uploader=request.args.get('uploader'),
+        output_dir=request.args.get('output_dir'),
+        search=request.args.get('q')
+    )
+    return jsonify({'items': items, 'total': total, 'page': page, 'per_page': per_page})
+
+@app.route('/api/library/<video_id>')
+def get_library_item(video_id):
+    """按视频ID查询是否已下载；传入 output_dir 时校验该目录中的视频文件仍然存在"""
+    output_dir = request.args.get('output_dir')
+    if output_dir:
+        item = find_downloaded(output_dir, video_id)
+        items = [item] if item else []
+    else:
+        items = get_catalog().get(video_id)
+    if not items:
+        return jsonify({'video_id': video_id, 'downloaded': False, 'items': []}), 404
+    return jsonify({'video_id': video_id, 'downloaded': True, 'items': items})
+
+@app.route('/api/download_profile/<task_id>')
+def download_profile(task_id):
+    """下载任务的 cProfile 结果（.prof 文件）"""
+    path = profile_path(os.path.basename(task_id))
+    if not os.path.exists(path):
+        return jsonify({'error': '该任务没有性能分析结果'}), 404
+    return send_file(path, as_attachment=True, download_name=os.path.basename(path))
+
+@app.route('/metrics')
+def export_metrics():
+    """以 Prometheus 文本格式导出监控指标"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 @socketio.on('connect')
 def handle_connect():
     """客户端连接"""
     print('客户端已连接')
 
+@socketio.on('join_session')
+def handle_join_session(data):
+    """客户端加入自己会话的房间，只接收该会话的日志与任务状态"""
+    session_id = (data or {}).get('session_id')
+    if not session_id:
+        return {'success': False}
+    join_room(session_id)
+    return {'success': True}
+
 @socketio.on('disconnect')
 def handle_disconnect():
     """客户端断开连接"""
@@ -316,4 +818,9 @@ if __name__ == '__main__':
     if not debug_mode:
         print("检测到Python 3.13+，已禁用调试模式以确保兼容性")
     
+    # 调试模式下重载器的父进程不处理请求，只在实际服务的进程中恢复任务
+    if not debug_mode or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        resume_unfinished_jobs()
+        evict_unused_cookie_uploads()
+    
     socketio.run(app, debug=debug_mode, host='0.0.0.0', port=5000)
\ No newline at end of file
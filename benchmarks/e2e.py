@@ -0,0 +1,276 @@
+"""端到端基准：在本地HTTP替身站点上运行完整的处理流程，不访问网络
+
+替身站点为每个合成视频提供一个HTML5视频页面（yt-dlp generic 提取器可直接解析）、
+媒体文件（支持Range请求）、日语VTT字幕和缩略图。每个任务依次执行
+get_video_info → download_video → download_subtitles → generate_metadata_files，
+按并发任务数（默认1/4/16）分别统计各阶段延迟、整体吞吐和进程峰值RSS。
+升级yt-dlp或修改配置前后各运行一次即可比较性能变化。
+
+请求限速默认放开（--request-rate），以免令牌桶的等待时间掩盖流程本身的耗时。
+
+用法:
+    python benchmarks/e2e.py
+    python benchmarks/e2e.py --jobs 32 --concurrency 1 8 --media-mb 16
+    python benchmarks/e2e.py --request-rate 2   # 按实际默认限速运行
+"""
+import argparse
+import contextlib
+import io
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+STAGES = ('info', 'video', 'subtitles', 'metadata')
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html><head><title>{title}</title>
+<meta name="description" content="Synthetic benchmark video {video_id}"></head>
+<body><video controls poster="/thumb/{video_id}.jpg">
+<source src="/media/{video_id}.mp4" type="video/mp4">
+<track kind="subtitles" srclang="ja" label="Japanese" src="/subs/{video_id}.ja.vtt">
+</video></body></html>
+"""
+
+_RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)$')
+
+
+def make_vtt(cues):
+    lines = ["WEBVTT", ""]
+    for i in range(cues):
+        start, end = i * 2, i * 2 + 2
+        lines.append(f"{start // 3600:02d}:{start // 60 % 60:02d}:{start % 60:02d}.000 --> "
+                     f"{end // 3600:02d}:{end // 60 % 60:02d}:{end % 60:02d}.000")
+        lines.append(f"字幕 {i} 行目のテキスト")
+        lines.append("")
+    return "\n".join(lines).encode('utf-8')
+
+
+class StandInSite:
+    """模拟YouTube的本地站点：所有视频共用同一份合成媒体/字幕/缩略图内容"""
+
+    def __init__(self, media_bytes, subtitle_cues, thumbnail_bytes):
+        self.media = os.urandom(1024) * (media_bytes // 1024)
+        self.vtt = make_vtt(subtitle_cues)
+        # JPEG 文件头 + 填充，内容本身不会被解码
+        self.thumbnail = b'\xff\xd8\xff\xe0' + os.urandom(thumbnail_bytes)
+        self.requests = 0
+        self._lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                with site._lock:
+                    site.requests += 1
+                kind, _, name = self.path.lstrip('/').partition('/')
+                video_id = name.split('.', 1)[0]
+                if kind == 'watch':
+                    body = PAGE_TEMPLATE.format(
+                        video_id=video_id, title=f"Benchmark {video_id}"
+                    ).encode('utf-8')
+                    self._send(body, 'text/html; charset=utf-8')
+                elif kind == 'media':
+                    self._send(site.media, 'video/mp4', ranged=True)
+                elif kind == 'subs':
+                    self._send(site.vtt, 'text/vtt; charset=utf-8')
+                elif kind == 'thumb':
+                    self._send(site.thumbnail, 'image/jpeg')
+                else:
+                    self.send_error(404)
+
+            def _send(self, body, content_type, ranged=False):
+                status, start, end = 200, 0, len(body) - 1
+                match = _RANGE_RE.match(self.headers.get('Range', '')) if ranged else None
+                if match and (match.group(1) or match.group(2)):
+                    if match.group(1):
+                        start = int(match.group(1))
+                        end = min(int(match.group(2)), end) if match.group(2) else end
+                    else:
+                        start = max(0, len(body) - int(match.group(2)))
+                    if start > end:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f'bytes */{len(body)}')
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    status = 206
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(end - start + 1))
+                if ranged:
+                    self.send_header('Accept-Ranges', 'bytes')
+                if status == 206:
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{len(body)}')
+                self.end_headers()
+                self.wfile.write(memoryview(body)[start:end + 1])
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def video_url(self, video_id):
+        return f"{self.base_url}/watch/{video_id}.html"
+
+
+def peak_rss_mb():
+    """进程峰值RSS（MB），不支持 resource 模块的平台返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def run_job(nfo, url, output_root):
+    """执行一个完整任务，返回 {阶段: 秒}；任一必需阶段失败时返回None"""
+    timings = {}
+
+    started = time.perf_counter()
+    info = nfo.get_video_info(url)
+    timings['info'] = time.perf_counter() - started
+    if not info:
+        return None
+    output_dir = os.path.join(output_root, info['title'])
+    os.makedirs(output_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    video = nfo.download_video(info, output_dir)
+    timings['video'] = time.perf_counter() - started
+    if not video:
+        return None
+
+    started = time.perf_counter()
+    nfo.download_subtitles(info, output_dir)
+    timings['subtitles'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    nfo.generate_metadata_files(info, output_dir)
+    timings['metadata'] = time.perf_counter() - started
+    if not info.artifacts.get('nfo') or not info.artifacts.get('subtitles'):
+        return None
+    return timings
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_level(nfo, site, concurrency, jobs, workdir, verbose=False):
+    """以 concurrency 个并发任务处理 jobs 个视频，返回统计结果"""
+    output_root = os.path.join(workdir, f"c{concurrency}")
+    urls = [site.video_url(f"c{concurrency}v{i:04d}") for i in range(jobs)]
+    requests_before = site.requests
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    started = time.perf_counter()
+    with output, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda url: run_job(nfo, url, output_root), urls))
+    wall = time.perf_counter() - started
+    succeeded = [r for r in results if r]
+    return {
+        'concurrency': concurrency,
+        'jobs': jobs,
+        'failed': jobs - len(succeeded),
+        'wall': wall,
+        'requests': site.requests - requests_before,
+        'media_mb': len(succeeded) * len(site.media) / 1024 / 1024,
+        'stages': {
+            stage: [r[stage] for r in succeeded] for stage in STAGES
+        },
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def print_level(result):
+    wall = result['wall']
+    done = result['jobs'] - result['failed']
+    print(f"\n🚀 并发 {result['concurrency']}: {done}/{result['jobs']} 个任务，耗时 {wall:.2f}s，"
+          f"{done / wall:.2f} 任务/s，媒体 {result['media_mb'] / wall:.1f}MB/s，"
+          f"{result['requests']} 个HTTP请求")
+    print(f"  阶段        {'p50':>9}{'p95':>9}{'max':>9}")
+    for stage, values in result['stages'].items():
+        if values:
+            print(f"  {stage:<12}{percentile(values, 0.5) * 1000:7.0f}ms"
+                  f"{percentile(values, 0.95) * 1000:7.0f}ms{max(values) * 1000:7.0f}ms")
+    if result['peak_rss_mb'] is not None:
+        print(f"  峰值RSS（进程累计）: {result['peak_rss_mb']:.1f}MB")
+    if result['failed']:
+        print(f"  ❌ {result['failed']} 个任务失败，使用 --verbose 查看详细输出")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="离线端到端性能基准")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16],
+                        help="依次测试的并发任务数")
+    parser.add_argument('--jobs', type=int, default=16, help="每个并发级别处理的视频数量")
+    parser.add_argument('--media-mb', type=float, default=4, help="每个视频的媒体文件大小（MB）")
+    parser.add_argument('--subtitle-cues', type=int, default=600, help="每个字幕文件的cue数量")
+    parser.add_argument('--thumbnail-kb', type=int, default=64, help="缩略图大小（KB）")
+    parser.add_argument('--request-rate', type=float, default=1000,
+                        help="每个主机的请求速率上限（请求/秒），默认基本不限速")
+    parser.add_argument('--keep', action='store_true', help="保留输出目录")
+    parser.add_argument('--verbose', action='store_true', help="显示处理流程的输出")
+    args = parser.parse_args(argv)
+
+    # 限速参数在导入 ratelimit 时读取，必须在导入 nfo 之前设置
+    os.environ['YT2EMBY_REQUEST_RATE'] = str(args.request_rate)
+    os.environ['YT2EMBY_MAX_REQUEST_RATE'] = str(args.request_rate)
+    import cache
+    import nfo
+
+    workdir = tempfile.mkdtemp(prefix='yt2emby-e2e-')
+    # 条件请求缓存写入临时目录，不污染项目的 cache/
+    cache.CACHE_DIR = os.path.join(workdir, 'cache')
+    failed = False
+    try:
+        import_started = time.perf_counter()
+        version = nfo.load_yt_dlp().version.__version__
+        print(f"📦 yt-dlp {version}（导入 {time.perf_counter() - import_started:.2f}s），"
+              f"媒体 {args.media_mb}MB，字幕 {args.subtitle_cues} cue，缩略图 {args.thumbnail_kb}KB")
+        rss = peak_rss_mb()
+        if rss is not None:
+            print(f"📏 初始峰值RSS: {rss:.1f}MB")
+        with StandInSite(int(args.media_mb * 1024 * 1024), args.subtitle_cues,
+                         args.thumbnail_kb * 1024) as site:
+            print(f"🌐 本地替身站点: {site.base_url}")
+            # 预热：首个任务会加载提取器等模块，不计入统计
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_job(nfo, site.video_url('warmup'), os.path.join(workdir, 'warmup'))
+            for concurrency in args.concurrency:
+                result = run_level(nfo, site, concurrency, args.jobs, workdir, args.verbose)
+                print_level(result)
+                failed = failed or bool(result['failed'])
+    finally:
+        if args.keep:
+            print(f"\n📁 输出目录: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
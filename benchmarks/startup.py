@@ -0,0 +1,97 @@
+"""启动耗时基准：统计导入 nfo / app / GUI 模块的耗时分布
+
+使用 `python -X importtime` 在独立进程中导入目标模块，输出总耗时和耗时最多的模块，
+并检查重量级依赖（yt-dlp、requests 等）是否在启动时被提前导入。
+
+用法:
+    python benchmarks/startup.py                  # 测试全部模块
+    python benchmarks/startup.py nfo app --top 15
+    python benchmarks/startup.py nfo --max-ms 300 # 超过阈值时返回非零退出码
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_TARGETS = ('nfo', 'app', 'youtube_to_emby_gui')
+
+# 启动时不应导入的重量级模块，首次使用时才加载
+LAZY_MODULES = ('yt_dlp', 'requests')
+# flask-socketio 依赖的 engineio 会自行导入 requests，Web端只检查其余模块
+LAZY_MODULES_EXEMPT = {'app': ('requests',)}
+
+
+def _import_times(code):
+    """运行 python -X importtime -c code，返回 {模块: 累计耗时us}"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=PROJECT_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        error = result.stderr.strip().splitlines()
+        raise RuntimeError(error[-1] if error else f"执行失败: {code}")
+    modules = {}
+    for line in result.stderr.splitlines():
+        # 格式: "import time:      self |  cumulative | package"
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        modules[parts[2].strip()] = int(parts[1])
+    return modules
+
+
+def measure(module, repeat=3):
+    """在新进程中导入模块，返回 (最好一次的总耗时ms, {模块: 累计耗时us})
+
+    解释器启动时（site 等）已导入的模块不计入结果。
+    """
+    baseline = set(_import_times('pass'))
+    best_total, best_modules = None, None
+    for _ in range(repeat):
+        modules = {
+            name: us for name, us in _import_times(f'import {module}').items()
+            if name not in baseline
+        }
+        total = modules.get(module, 0) / 1000
+        if best_total is None or total < best_total:
+            best_total, best_modules = total, modules
+    return best_total, best_modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="统计模块导入耗时")
+    parser.add_argument('targets', nargs='*', default=DEFAULT_TARGETS)
+    parser.add_argument('--top', type=int, default=10, help="显示耗时最多的前N个模块")
+    parser.add_argument('--repeat', type=int, default=3, help="每个模块重复测量次数，取最好成绩")
+    parser.add_argument('--max-ms', type=float, default=None, help="导入耗时上限（毫秒）")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for target in args.targets:
+        try:
+            total, modules = measure(target, args.repeat)
+        except RuntimeError as e:
+            print(f"⚠️ {target}: 跳过（{e}）")
+            continue
+        print(f"\n📦 {target}: {total:.1f} ms")
+        top_level = {name: us for name, us in modules.items() if '.' not in name and name != target}
+        for name, us in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {us / 1000:8.1f} ms  {name}")
+
+        exempt = LAZY_MODULES_EXEMPT.get(target, ())
+        eager = [name for name in LAZY_MODULES if name in modules and name not in exempt]
+        if eager:
+            print(f"❌ 启动时导入了应延迟加载的模块: {', '.join(eager)}")
+            failed = True
+        if args.max_ms is not None and total > args.max_ms:
+            print(f"❌ 导入耗时 {total:.1f} ms 超过上限 {args.max_ms:.1f} ms")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
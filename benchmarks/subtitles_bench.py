@@ -0,0 +1,151 @@
+"""字幕转换基准：生成YouTube自动字幕风格的VTT文件，测量转换速度与峰值内存
+
+单文件：比较流式转换（subtitles.convert_vtt）与 webvtt-py + pysubs2 的旧实现（已安装时）；
+批量：比较逐个转换与进程池 convert_directory 的总耗时。
+
+用法:
+    python benchmarks/subtitles_bench.py
+    python benchmarks/subtitles_bench.py --cues 50000 --files 32 --workers 4
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from subtitles import convert_vtt, convert_directory, iter_events, iter_vtt_cues  # noqa: E402
+
+WORDS = ('so', 'today', 'we', 'are', 'going', 'to', 'look', 'at', 'the', 'new',
+         'update', 'and', 'what', 'it', 'means', 'for', 'everyone', 'watching')
+
+
+def _ts(ms):
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{ms:03d}"
+
+
+def _sentence(i):
+    return [WORDS[(i + k) % len(WORDS)] for k in range(6)]
+
+
+def write_auto_caption_vtt(path, cues):
+    """写出滚动式自动字幕：每句一个带逐词时间戳的长 cue 加一个10ms的过渡 cue
+
+    与 YouTube 一致，第一个 cue 的上一行是单个空格（空行会提前结束 cue，不是合法的 VTT）。
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("WEBVTT\nKind: captions\nLanguage: en\n\n")
+        previous = ' '
+        start = 0
+        for i in range(cues // 2):
+            words = _sentence(i)
+            timed = words[0] + ''.join(
+                f"<{_ts(start + 300 * (k + 1))}><c> {word}</c>" for k, word in enumerate(words[1:])
+            )
+            plain = ' '.join(words)
+            end = start + 2000
+            f.write(f"{_ts(start)} --> {_ts(end)} align:start position:0%\n{previous}\n{timed}\n\n")
+            f.write(f"{_ts(end)} --> {_ts(end + 10)} align:start position:0%\n{previous}\n{plain}\n\n")
+            previous = plain
+            start = end + 10
+
+
+def verify_conversion(vtt_path, cues):
+    """检查滚动去重后的结果：每句恰好一条、时间与文本正确，返回不符合的条数"""
+    expected = [(i * 2010, i * 2010 + 2000, [' '.join(_sentence(i))]) for i in range(cues // 2)]
+    with open(vtt_path, 'r', encoding='utf-8') as f:
+        actual = [event[:3] for event in iter_events(iter_vtt_cues(f), 'srt')]
+    mismatched = sum(1 for a, e in zip(actual, expected) if a != e)
+    return mismatched + abs(len(actual) - len(expected))
+
+
+def legacy_convert(vtt_path, ass_path):
+    """旧实现：webvtt-py 读入全部字幕后用 pysubs2 写出"""
+    import webvtt
+    from pysubs2 import SSAFile, SSAEvent
+    subs = SSAFile()
+    for caption in webvtt.read(vtt_path):
+        subs.events.append(SSAEvent(
+            start=caption.start_in_seconds * 1000,
+            end=caption.end_in_seconds * 1000,
+            text=caption.text.replace('\n', '\\N')
+        ))
+    subs.save(ass_path)
+    return len(subs.events)
+
+
+def measure(func, *args):
+    """返回 (结果, 耗时秒, 峰值内存MB)；tracemalloc 会拖慢执行，耗时单独测量"""
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cues', type=int, default=20000, help="单个VTT文件的cue数量")
+    parser.add_argument('--files', type=int, default=8, help="批量测试的文件数量")
+    parser.add_argument('--batch-cues', type=int, default=20000, help="批量测试中每个文件的cue数量")
+    parser.add_argument('--workers', type=int, default=None, help="进程池大小（默认为CPU核数）")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='yt2emby-subs-')
+    try:
+        vtt_path = os.path.join(workdir, 'sample.en.vtt')
+        write_auto_caption_vtt(vtt_path, args.cues)
+        size_mb = os.path.getsize(vtt_path) / 1024 / 1024
+        print(f"单文件: {args.cues} 个cue，{size_mb:.1f}MB")
+        errors = verify_conversion(vtt_path, args.cues)
+        if errors:
+            print(f"❌ 转换结果不正确: {errors} 条字幕与预期不符")
+            sys.exit(1)
+        print("  - 转换结果校验通过")
+
+        for fmt in ('ass', 'srt'):
+            out = os.path.join(workdir, f"sample.en.{fmt}")
+            count, elapsed, peak = measure(convert_vtt, vtt_path, out, fmt)
+            print(f"  - 流式 {fmt}: {elapsed:.2f}s，{size_mb / elapsed:.1f}MB/s，"
+                  f"峰值内存 {peak:.1f}MB，输出 {count} 条")
+        try:
+            count, elapsed, peak = measure(legacy_convert, vtt_path, os.path.join(workdir, 'legacy.ass'))
+            print(f"  - webvtt+pysubs2 ass: {elapsed:.2f}s，{size_mb / elapsed:.1f}MB/s，"
+                  f"峰值内存 {peak:.1f}MB，输出 {count} 条")
+        except ImportError:
+            print("  - webvtt+pysubs2: 未安装，跳过对比")
+
+        batch_dir = os.path.join(workdir, 'library')
+        os.makedirs(batch_dir)
+        for i in range(args.files):
+            write_auto_caption_vtt(os.path.join(batch_dir, f"video{i:03d}.en.vtt"), args.batch_cues)
+        print(f"批量: {args.files} 个文件，每个 {args.batch_cues} 个cue")
+
+        started = time.perf_counter()
+        for name in sorted(os.listdir(batch_dir)):
+            path = os.path.join(batch_dir, name)
+            convert_vtt(path, os.path.splitext(path)[0] + '.srt', 'srt')
+        serial = time.perf_counter() - started
+        print(f"  - 逐个转换: {serial:.2f}s")
+
+        started = time.perf_counter()
+        converted, failed, _ = convert_directory(batch_dir, 'ass', args.workers)
+        parallel = time.perf_counter() - started
+        print(f"  - 进程池: {parallel:.2f}s（成功 {converted}，失败 {failed}），"
+              f"加速 {serial / parallel:.1f}x")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""本地持久化缓存
+
+MetadataCache 以YouTube视频ID为键，把裁剪后的视频信息保存在SQLite中，
+支持TTL过期与按总大小的LRU淘汰，重复获取同一视频的信息时无需再请求YouTube。
+HttpValidatorCache 记录已下载文件的 ETag/Last-Modified，用于条件请求。
+"""
+import os
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+
+DEFAULT_TTL = 7 * 24 * 3600          # 缓存有效期：7天
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 缓存总大小上限：64MB
+
+
+class SQLiteStore:
+    """SQLite存储的公共部分：建表与短连接事务"""
+
+    SCHEMA = ()
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    @contextmanager
+    def _connect(self):
+        """打开连接并在一个事务内执行，结束后关闭连接"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+
+class MetadataCache(SQLiteStore):
+    """按视频ID缓存视频信息（SQLite，TTL + 按大小LRU淘汰）"""
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS video_info (
+            video_id TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_video_info_accessed ON video_info(accessed_at)",
+    )
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        super().__init__(path or os.path.join(CACHE_DIR, 'metadata.sqlite3'))
+
+    def get(self, video_id):
+        """返回缓存的视频信息，不存在或已过期返回None"""
+        if not video_id:
+            return None
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT payload, created_at FROM video_info WHERE video_id = ?",
+                (video_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            payload, created_at = row
+            if self.ttl and now - created_at > self.ttl:
+                conn.execute("DELETE FROM video_info WHERE video_id = ?", (video_id,))
+                return None
+            conn.execute(
+                "UPDATE video_info SET accessed_at = ? WHERE video_id = ?",
+                (now, video_id)
+            )
+        try:
+            return json.loads(payload)
+        except ValueError:
+            self.delete(video_id)
+            return None
+
+    def set(self, video_id, info):
+        """写入视频信息，并在超出大小上限时淘汰最久未访问的条目"""
+        if not video_id:
+            return
+        payload = json.dumps(info, ensure_ascii=False)
+        size = len(payload.encode('utf-8'))
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO video_info (video_id, payload, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (video_id, payload, size, now, now)
+            )
+            self._evict(conn, now)
+
+    def delete(self, video_id):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM video_info WHERE video_id = ?", (video_id,))
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM video_info")
+
+    def _evict(self, conn, now):
+        if self.ttl:
+            conn.execute("DELETE FROM video_info WHERE created_at < ?", (now - self.ttl,))
+        if not self.max_bytes:
+            return
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM video_info").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for video_id, size in conn.execute(
+            "SELECT video_id, size FROM video_info ORDER BY accessed_at ASC"
+        ).fetchall():
+            conn.execute("DELETE FROM video_info WHERE video_id = ?", (video_id,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+class HttpValidatorCache(SQLiteStore):
+    """按URL记录已下载文件的 ETag / Last-Modified"""
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS http_validators (
+            url TEXT NOT NULL,
+            path TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (url, path)
+        )
+        """,
+    )
+
+    def __init__(self, path=None):
+        super().__init__(path or os.path.join(CACHE_DIR, 'http.sqlite3'))
+
+    def get(self, url, path):
+        """返回 (etag, last_modified)，没有记录时返回 (None, None)"""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT etag, last_modified FROM http_validators WHERE url = ? AND path = ?",
+                (url, os.path.abspath(path))
+            ).fetchone()
+        return row if row else (None, None)
+
+    def set(self, url, path, etag, last_modified):
+        if not etag and not last_modified:
+            self.delete(url, path)
+            return
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO http_validators (url, path, etag, last_modified, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (url, os.path.abspath(path), etag, last_modified, time.time())
+            )
+
+    def delete(self, url, path):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "DELETE FROM http_validators WHERE url = ? AND path = ?",
+                (url, os.path.abspath(path))
+            )
+
+
+_metadata_cache = None
+_http_validator_cache = None
+_metadata_cache_lock = threading.Lock()
+
+
+def get_metadata_cache():
+    """返回进程内共享的元数据缓存实例"""
+    global _metadata_cache
+    with _metadata_cache_lock:
+        if _metadata_cache is None:
+            _metadata_cache = MetadataCache()
+        return _metadata_cache
+
+
+def get_http_validator_cache():
+    """返回进程内共享的 ETag/Last-Modified 缓存实例"""
+    global _http_validator_cache
+    with _metadata_cache_lock:
+        if _http_validator_cache is None:
+            _http_validator_cache = HttpValidatorCache()
+        return _http_validator_cache
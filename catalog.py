@@ -0,0 +1,205 @@
+"""本地媒体库目录（SQLite）
+
+每个完成的任务把视频ID、标题、上传者、发布日期、产物路径与大小、格式写入目录，
+按视频ID、上传者、发布日期和完成时间建立索引。判断视频是否已下载时只需一次索引查询
+和一次 stat，不依赖按标题命名的文件夹，也不用在NAS上遍历目录。
+
+同一视频下载到不同的输出根目录时各有一条记录。已有媒体库可以从任务清单导入:
+    python catalog.py ./downloads
+"""
+import os
+import sys
+import argparse
+import threading
+import time
+
+from cache import SQLiteStore
+from manifest import find_completed, find_manifests, iter_artifacts, load_manifest
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+COLUMNS = (
+    'video_id', 'output_dir', 'title', 'uploader', 'upload_date', 'year', 'folder',
+    'video_path', 'video_size', 'total_size', 'video_format', 'format_id', 'completed_at'
+)
+
+
+class Catalog(SQLiteStore):
+    """已下载视频的索引，主键为 (视频ID, 输出根目录)"""
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS items (
+            video_id TEXT NOT NULL,
+            output_dir TEXT NOT NULL,
+            title TEXT,
+            uploader TEXT,
+            upload_date TEXT,
+            year TEXT,
+            folder TEXT,
+            video_path TEXT NOT NULL,
+            video_size INTEGER,
+            total_size INTEGER,
+            video_format TEXT,
+            format_id TEXT,
+            completed_at REAL NOT NULL,
+            PRIMARY KEY (video_id, output_dir)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_items_uploader ON items(uploader, upload_date)",
+        "CREATE INDEX IF NOT EXISTS idx_items_upload_date ON items(upload_date)",
+        "CREATE INDEX IF NOT EXISTS idx_items_completed ON items(completed_at)",
+    )
+
+    def __init__(self, path=None):
+        super().__init__(path or os.path.join(DATA_DIR, 'catalog.sqlite3'))
+
+    def add(self, base_output_dir, info, artifacts, completed_at=None):
+        """登记一个已完成的视频；info 为 VideoInfo.to_dict() 或清单中的 info"""
+        video = artifacts.get('video')
+        if not info.get('video_id') or not video:
+            return False
+        output_dir = os.path.abspath(base_output_dir)
+        video_path = os.path.abspath(video['path'])
+        total_size = sum(record.get('size') or 0 for record in iter_artifacts({'artifacts': artifacts}))
+        row = (
+            info['video_id'], output_dir, info.get('title'), info.get('uploader'),
+            info.get('publish_date'), info.get('year'), os.path.dirname(video_path), video_path,
+            video.get('size'), total_size, os.path.splitext(video_path)[1].lstrip('.').lower() or None,
+            video.get('format_id'), completed_at or time.time(),
+        )
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO items ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+                row
+            )
+        return True
+
+    def add_manifest(self, base_output_dir, manifest):
+        """按任务清单登记（清单中的路径为 load_manifest 还原后的绝对路径）"""
+        return self.add(base_output_dir, manifest.get('info') or {}, manifest.get('artifacts') or {},
+                        manifest.get('completed_at'))
+
+    def remove(self, video_id, output_dir):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "DELETE FROM items WHERE video_id = ? AND output_dir = ?",
+                (video_id, os.path.abspath(output_dir))
+            )
+
+    def get(self, video_id):
+        """返回该视频在各输出根目录中的记录（不检查文件）"""
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM items WHERE video_id = ? ORDER BY completed_at DESC",
+                (video_id,)
+            ).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def find(self, video_id, output_dir):
+        """已下载到 output_dir 且视频文件仍在（大小一致）时返回记录，否则返回None
+
+        文件已被删除或替换的记录会从目录中移除。
+        """
+        if not video_id:
+            return None
+        output_dir = os.path.abspath(output_dir)
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM items WHERE video_id = ? AND output_dir = ?",
+                (video_id, output_dir)
+            ).fetchone()
+        if row is None:
+            return None
+        item = dict(zip(COLUMNS, row))
+        try:
+            if os.path.getsize(item['video_path']) == item['video_size']:
+                return item
+        except OSError:
+            pass
+        self.remove(video_id, output_dir)
+        return None
+
+    def query(self, page=1, per_page=DEFAULT_PAGE_SIZE, uploader=None, output_dir=None, search=None):
+        """分页列出记录（按完成时间倒序），返回 (记录列表, 总数)
+
+        列表直接来自索引，不逐个检查文件是否存在。
+        """
+        page = max(1, int(page))
+        per_page = min(MAX_PAGE_SIZE, max(1, int(per_page)))
+        conditions, params = [], []
+        if uploader:
+            conditions.append("uploader = ?")
+            params.append(uploader)
+        if output_dir:
+            conditions.append("output_dir = ?")
+            params.append(os.path.abspath(output_dir))
+        if search:
+            conditions.append("title LIKE ? ESCAPE '\\'")
+            escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f"%{escaped}%")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        with self._lock, self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM items {where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM items {where} "
+                "ORDER BY completed_at DESC LIMIT ? OFFSET ?",
+                (*params, per_page, (page - 1) * per_page)
+            ).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows], total
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """返回进程内共享的媒体库目录实例"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = Catalog()
+        return _catalog
+
+
+def find_downloaded(base_output_dir, video_id, catalog=None):
+    """判断视频是否已下载到 base_output_dir，返回目录记录或None，不发起网络请求
+
+    目录中没有记录时回退到任务清单校验，校验通过的视频补登记到目录。
+    """
+    catalog = catalog or get_catalog()
+    item = catalog.find(video_id, base_output_dir)
+    if item is None and video_id:
+        manifest = find_completed(base_output_dir, video_id)
+        if manifest and catalog.add_manifest(base_output_dir, manifest):
+            item = catalog.find(video_id, base_output_dir)
+    return item
+
+
+def import_manifests(root, catalog=None):
+    """把 root 下所有任务清单导入目录，返回导入的数量"""
+    catalog = catalog or get_catalog()
+    imported = 0
+    for base_output_dir, video_id in find_manifests(root):
+        manifest = load_manifest(base_output_dir, video_id)
+        if manifest and catalog.add_manifest(base_output_dir, manifest):
+            imported += 1
+    return imported
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="从任务清单导入本地媒体库目录")
+    parser.add_argument('roots', nargs='+', help="下载目录（包含 .manifests 的输出根目录或其上级目录）")
+    args = parser.parse_args(argv)
+    started = time.monotonic()
+    imported = sum(import_manifests(root) for root in args.roots)
+    print(f"✅ 已导入 {imported} 个视频，用时 {time.monotonic() - started:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Cookie 存储
+
+CookieStore 把每个 cookie 文件只解析一次，同一账号（同一文件）的所有任务共用内存中的
+cookie jar，yt-dlp 刷新的会话 cookie 会立即被其他任务使用；任务结束时仅在内容变化后
+原子写回文件。上传的 cookie 文件按内容哈希命名去重，长期未使用的会被清理。
+"""
+import os
+import io
+import glob
+import hashlib
+import threading
+import time
+
+UPLOAD_PREFIX = 'cookies_'
+DEFAULT_UPLOAD_TTL = 7 * 24 * 3600  # 上传的 cookie 文件未使用超过7天后清理
+
+
+def normalize_cookie_path(path):
+    """统一 cookie 文件路径的写法（引号、环境变量、~、相对路径、符号链接），同一文件只对应一个键"""
+    return os.path.realpath(os.path.expanduser(os.path.expandvars(path.strip().strip('"'))))
+
+
+def _serialize(jar):
+    """返回 jar 的 Netscape 格式文本，不改变内存中的 cookie"""
+    buffer = io.StringIO()
+    # 其他任务可能正在写入 cookie，遍历时持有 jar 的内部锁
+    with jar._cookies_lock:
+        # yt-dlp 的 save() 会把会话 cookie 的 expires 从 None 改为 0，之后这些 cookie
+        # 在共享的 jar 中被视为已过期而不再发送，写出后需恢复
+        session_cookies = [cookie for cookie in jar if cookie.expires is None]
+        try:
+            jar.save(buffer)
+        finally:
+            for cookie in session_cookies:
+                cookie.expires = None
+    return buffer.getvalue()
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class CookieStore:
+    """按文件路径缓存已解析的 cookie jar，文件被外部修改（mtime/大小变化）时重新解析"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get_jar(self, path):
+        """返回 path 对应的共享 YoutubeDLCookieJar"""
+        from yt_dlp.cookies import YoutubeDLCookieJar
+        path = normalize_cookie_path(path)
+        signature = _file_signature(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry['signature'] != signature:
+                jar = YoutubeDLCookieJar(path)
+                if signature is not None:
+                    jar.load()
+                entry = {
+                    'jar': jar,
+                    'signature': signature,
+                    'saved_hash': hashlib.sha256(_serialize(jar).encode('utf-8')).hexdigest(),
+                }
+                self._entries[path] = entry
+                self.loads += 1
+            entry['last_used'] = time.time()
+            return entry['jar']
+
+    def save(self, path):
+        """内容有变化时把 jar 原子写回文件，返回是否写入"""
+        path = normalize_cookie_path(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return False
+            data = _serialize(entry['jar'])
+            digest = hashlib.sha256(data.encode('utf-8')).hexdigest()
+            if digest == entry['saved_hash']:
+                return False
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+            entry['saved_hash'] = digest
+            entry['signature'] = _file_signature(path)
+            return True
+
+    def last_used(self, path):
+        entry = self._entries.get(normalize_cookie_path(path))
+        return entry.get('last_used', 0.0) if entry else 0.0
+
+    def forget(self, path):
+        with self._lock:
+            self._entries.pop(normalize_cookie_path(path), None)
+
+
+def store_upload(data, directory):
+    """保存上传的 cookie 内容，相同内容复用已有文件，返回 (文件路径, 是否复用)"""
+    digest = hashlib.sha256(data).hexdigest()
+    path = os.path.join(directory, f"{UPLOAD_PREFIX}{digest[:16]}.txt")
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(path):
+        os.utime(path)  # 刷新修改时间，避免被当作过期文件清理
+        return path, True
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return path, False
+
+
+def evict_stale_uploads(directory, ttl=DEFAULT_UPLOAD_TTL, keep=()):
+    """删除超过 ttl 秒未修改也未使用的上传 cookie 文件（keep 中的路径除外），返回删除数量"""
+    store = get_cookie_store()
+    keep = {normalize_cookie_path(p) for p in keep if p}
+    now = time.time()
+    removed = 0
+    for path in glob.glob(os.path.join(directory, f"{UPLOAD_PREFIX}*.txt")):
+        path = os.path.abspath(path)
+        if path in keep:
+            continue
+        try:
+            last = max(os.path.getmtime(path), store.last_used(path))
+            if now - last <= ttl:
+                continue
+            os.remove(path)
+        except OSError:
+            continue
+        store.forget(path)
+        removed += 1
+    return removed
+
+
+_cookie_store = None
+_cookie_store_lock = threading.Lock()
+
+
+def get_cookie_store():
+    """返回进程内共享的 cookie 存储"""
+    global _cookie_store
+    with _cookie_store_lock:
+        if _cookie_store is None:
+            _cookie_store = CookieStore()
+        return _cookie_store
@@ -0,0 +1,176 @@
+"""Emby 媒体库定向刷新
+
+任务完成后把视频所在目录交给 EmbyNotifier，短时间内完成的多个任务合并为一次
+POST /Library/Media/Updated 调用，只让 Emby 扫描这些目录，而不是重新扫描整个媒体库。
+最后一个任务完成 debounce 秒后发送；持续有任务完成时，最早的路径最多等待 max_delay 秒。
+
+通过环境变量配置，未设置 YT2EMBY_EMBY_URL / YT2EMBY_EMBY_API_KEY 时不启用：
+    YT2EMBY_EMBY_URL         Emby 服务器地址，例如 http://localhost:8096
+    YT2EMBY_EMBY_API_KEY     Emby 控制台中创建的 API 密钥
+    YT2EMBY_EMBY_DEBOUNCE    合并窗口（秒，默认10）
+    YT2EMBY_EMBY_PATH_MAP    本机路径到 Emby 服务器路径的映射，例如 /data/downloads=/media/youtube，
+                             多条用分号分隔（Emby 运行在容器或其他机器上时使用）
+
+用法（手动发送一次刷新，用于检查配置）:
+    python emby.py /path/to/downloads/视频标题
+"""
+import os
+import sys
+import argparse
+import atexit
+import threading
+import time
+
+import metrics
+
+DEFAULT_DEBOUNCE = 10.0
+DEFAULT_MAX_DELAY = 60.0
+RETRY_DELAY = 60.0  # 刷新请求失败后重试的间隔（秒）
+REQUEST_TIMEOUT = 30
+
+REFRESHES = metrics.counter('yt2emby_emby_refreshes_total', 'Emby 定向刷新请求数', ('result',))
+REFRESHED_PATHS = metrics.counter('yt2emby_emby_refreshed_paths_total', '通知 Emby 刷新的目录数')
+
+
+def parse_path_map(value):
+    """解析 "本机前缀=服务器前缀;..." 格式的路径映射"""
+    mapping = []
+    for item in (value or '').split(';'):
+        local, sep, remote = item.partition('=')
+        if sep and local.strip():
+            mapping.append((os.path.abspath(local.strip()), remote.strip()))
+    # 长前缀优先匹配
+    return sorted(mapping, key=lambda pair: -len(pair[0]))
+
+
+class EmbyNotifier:
+    """收集已完成任务的目录，按合并窗口批量通知 Emby 刷新"""
+
+    def __init__(self, base_url, api_key, debounce=DEFAULT_DEBOUNCE, max_delay=DEFAULT_MAX_DELAY,
+                 path_map=()):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.debounce = debounce
+        self.max_delay = max(max_delay, debounce)
+        self.path_map = list(path_map)
+        self._pending = {}  # 有序去重的待刷新路径
+        self._first = None
+        self._last = None
+        self._not_before = 0.0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def map_path(self, path):
+        path = os.path.abspath(path)
+        for local, remote in self.path_map:
+            if path == local or path.startswith(local.rstrip(os.sep) + os.sep):
+                return remote.rstrip('/') + path[len(local):].replace(os.sep, '/')
+        return path
+
+    def notify(self, path):
+        """登记一个已完成的目录或文件，在合并窗口结束后统一刷新"""
+        path = self.map_path(path)
+        with self._cond:
+            now = time.monotonic()
+            self._pending[path] = None
+            if self._first is None:
+                self._first = now
+            self._last = now
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='emby-refresh', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _due(self):
+        return max(self._not_before, min(self._last + self.debounce, self._first + self.max_delay))
+
+    def _take_pending(self):
+        paths = list(self._pending)
+        self._pending.clear()
+        self._first = self._last = None
+        return paths
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                wait = self._due() - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                paths = self._take_pending()
+            self._send(paths)
+
+    def flush(self):
+        """立即发送尚未发送的刷新请求（批处理结束或程序退出时调用），返回是否成功"""
+        with self._cond:
+            paths = self._take_pending()
+        return self._send(paths) if paths else True
+
+    def _send(self, paths):
+        import requests
+        try:
+            response = requests.post(
+                f"{self.base_url}/Library/Media/Updated",
+                json={'Updates': [{'Path': path, 'UpdateType': 'Created'} for path in paths]},
+                headers={'X-Emby-Token': self.api_key},
+                timeout=REQUEST_TIMEOUT,
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            REFRESHES.inc(result='failed')
+            print(f"⚠️ Emby 刷新请求失败，{RETRY_DELAY:.0f}s 后重试: {e}")
+            with self._cond:
+                now = time.monotonic()
+                for path in paths:
+                    self._pending.setdefault(path, None)
+                self._first = self._first or now
+                self._last = self._last or now
+                self._not_before = now + RETRY_DELAY
+                self._cond.notify()
+            return False
+        REFRESHES.inc(result='ok')
+        REFRESHED_PATHS.inc(len(paths))
+        print(f"📺 已通知 Emby 刷新 {len(paths)} 个目录")
+        return True
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def get_emby_notifier():
+    """返回按环境变量配置的共享 EmbyNotifier，未配置 Emby 时返回None"""
+    global _notifier
+    base_url = os.environ.get('YT2EMBY_EMBY_URL', '').strip()
+    api_key = os.environ.get('YT2EMBY_EMBY_API_KEY', '').strip()
+    if not base_url or not api_key:
+        return None
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = EmbyNotifier(
+                base_url, api_key,
+                debounce=float(os.environ.get('YT2EMBY_EMBY_DEBOUNCE', str(DEFAULT_DEBOUNCE))),
+                path_map=parse_path_map(os.environ.get('YT2EMBY_EMBY_PATH_MAP')),
+            )
+            # 退出前发送合并窗口中尚未发送的刷新
+            atexit.register(_notifier.flush)
+        return _notifier
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="通知 Emby 刷新指定目录")
+    parser.add_argument('paths', nargs='+', help="要刷新的目录或文件")
+    args = parser.parse_args(argv)
+    notifier = get_emby_notifier()
+    if notifier is None:
+        print("❌ 未配置 YT2EMBY_EMBY_URL / YT2EMBY_EMBY_API_KEY")
+        return 1
+    for path in args.paths:
+        notifier.notify(path)
+    return 0 if notifier.flush() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""下载任务日志（持久化）
+
+JobJournal 把每个Web下载任务的参数、阶段切换和各阶段完成后的状态写入SQLite（WAL模式），
+服务重启后可以找出未完成的任务重新排队，并从最后完成的阶段继续执行。
+"""
+import os
+import json
+import time
+
+from cache import SQLiteStore
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# 任务的各个阶段，按执行顺序排列
+JOB_STAGES = ('info', 'video', 'subtitles', 'metadata')
+# merged: 重复提交的任务已合并到同一视频的其他任务，不再单独执行
+FINISHED_STATUSES = ('completed', 'error', 'merged')
+
+# 已结束任务在日志中的保留时长（秒）
+DEFAULT_RETENTION = 7 * 24 * 3600
+
+
+class JobJournal(SQLiteStore):
+    """记录任务参数、状态变化与已完成阶段"""
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            task_id TEXT PRIMARY KEY,
+            params TEXT NOT NULL,
+            status TEXT NOT NULL,
+            completed_stages TEXT NOT NULL DEFAULT '[]',
+            state TEXT NOT NULL DEFAULT '{}',
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)",
+        """
+        CREATE TABLE IF NOT EXISTS job_events (
+            task_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_job_events_task ON job_events(task_id)",
+    )
+
+    def __init__(self, path=None):
+        super().__init__(path or os.path.join(DATA_DIR, 'jobs.sqlite3'))
+
+    def record_job(self, task_id, **params):
+        """登记新任务（已存在时保留原有进度）"""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO jobs (task_id, params, status, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, ?)",
+                (task_id, json.dumps(params, ensure_ascii=False), now, now)
+            )
+            conn.execute(
+                "INSERT INTO job_events (task_id, status, at) VALUES (?, 'queued', ?)",
+                (task_id, now)
+            )
+
+    def update_status(self, task_id, status):
+        """记录状态变化"""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE task_id = ?",
+                (status, now, task_id)
+            )
+            conn.execute(
+                "INSERT INTO job_events (task_id, status, at) VALUES (?, ?, ?)",
+                (task_id, status, now)
+            )
+
+    def complete_stage(self, task_id, stage, **state):
+        """标记阶段完成，并合并保存恢复该阶段之后所需的状态"""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT completed_stages, state FROM jobs WHERE task_id = ?", (task_id,)
+            ).fetchone()
+            if row is None:
+                return
+            stages = json.loads(row[0])
+            merged = json.loads(row[1])
+            if stage not in stages:
+                stages.append(stage)
+            merged.update(state)
+            conn.execute(
+                "UPDATE jobs SET completed_stages = ?, state = ?, updated_at = ? WHERE task_id = ?",
+                (json.dumps(stages), json.dumps(merged, ensure_ascii=False), time.time(), task_id)
+            )
+
+    def get(self, task_id):
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT task_id, params, status, completed_stages, state FROM jobs WHERE task_id = ?",
+                (task_id,)
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def unfinished(self):
+        """返回所有未结束的任务，按创建顺序排列"""
+        placeholders = ', '.join('?' for _ in FINISHED_STATUSES)
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT task_id, params, status, completed_stages, state FROM jobs "
+                f"WHERE status NOT IN ({placeholders}) ORDER BY created_at",
+                FINISHED_STATUSES
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def prune(self, retention=DEFAULT_RETENTION):
+        """删除结束时间早于保留期限的任务及其事件"""
+        cutoff = time.time() - retention
+        placeholders = ', '.join('?' for _ in FINISHED_STATUSES)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "DELETE FROM job_events WHERE task_id IN (SELECT task_id FROM jobs "
+                f"WHERE status IN ({placeholders}) AND updated_at < ?)",
+                (*FINISHED_STATUSES, cutoff)
+            )
+            conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?",
+                (*FINISHED_STATUSES, cutoff)
+            )
+
+    @staticmethod
+    def _row_to_job(row):
+        task_id, params, status, completed_stages, state = row
+        return {
+            'task_id': task_id,
+            'params': json.loads(params),
+            'status': status,
+            'completed_stages': json.loads(completed_stages),
+            'state': json.loads(state),
+        }
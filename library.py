@@ -0,0 +1,148 @@
+"""离线重建媒体库元数据
+
+遍历下载目录中的任务清单（.manifests/<视频ID>.json），用清单里保存的视频信息重新生成
+NFO 文件，并按当前命名规则整理海报，不发起任何网络请求。内容没有变化的文件不会被改写，
+修改过的文件会同步更新清单中的记录。修改 NFO 格式后无需重新下载即可更新整个媒体库。
+
+用法:
+    python library.py ./downloads
+    python library.py ./downloads --workers 16 --dry-run
+"""
+import os
+import sys
+import argparse
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from catalog import get_catalog
+from manifest import artifact_record, find_manifests, load_manifest, write_manifest
+from nfo import FANART_FILENAME, VideoInfo, build_nfo_xml, metadata_paths
+
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+def write_if_changed(path, data, dry_run=False):
+    """内容与现有文件不同时原子写入，返回是否（需要）写入"""
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass
+    if not dry_run:
+        temp_path = f"{path}.part"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    return True
+
+
+def rebuild_item(base_output_dir, video_id, dry_run=False):
+    """重建单个视频的 NFO 与海报，返回 (状态, 已写入的文件列表, 只更新了清单记录的文件列表)
+
+    状态为 'updated'、'unchanged' 或 'no_poster'（本地找不到可用的海报，需要联网下载）。
+    清单保留原来的完成时间，有变化的视频同时刷新媒体库目录中的记录。
+    """
+    manifest = load_manifest(base_output_dir, video_id)
+    if manifest is None:
+        raise ValueError(f"无法读取清单: {video_id}")
+    info = VideoInfo.from_dict(manifest['info'])
+    artifacts = manifest.get('artifacts') or {}
+    video = artifacts.get('video')
+    output_dir = os.path.dirname(video['path']) if video else os.path.join(base_output_dir, info.title)
+    nfo_path, poster_path = metadata_paths(info, output_dir)
+    changed = []
+    relinked = []  # 文件已按当前命名规则存在，只需更新清单中的路径
+
+    nfo_data = build_nfo_xml(info)
+    if write_if_changed(nfo_path, nfo_data, dry_run):
+        changed.append(nfo_path)
+        artifacts['nfo'] = {'path': nfo_path, 'sha256': hashlib.sha256(nfo_data).hexdigest()}
+
+    # 海报只使用本地已有的文件：清单记录的旧路径与当前命名规则不同时复制到新路径
+    status = 'updated' if changed else 'unchanged'
+    recorded = (artifacts.get('poster') or {}).get('path')
+    if not os.path.exists(poster_path):
+        if recorded and os.path.exists(recorded):
+            with open(recorded, 'rb') as f:
+                poster_data = f.read()
+            write_if_changed(poster_path, poster_data, dry_run)
+            changed.append(poster_path)
+            artifacts['poster'] = {'path': poster_path, 'sha256': hashlib.sha256(poster_data).hexdigest()}
+            status = 'updated'
+        elif not changed:
+            status = 'no_poster'
+    elif recorded != poster_path:
+        relinked.append(poster_path)
+        artifacts['poster'] = {'path': poster_path, 'sha256': None}
+        status = 'updated'
+
+    # 早期版本没有 fanart.jpg，用海报补齐
+    fanart_path = os.path.join(output_dir, FANART_FILENAME)
+    poster = artifacts.get('poster')
+    if poster and not os.path.exists(fanart_path) and (dry_run or os.path.exists(poster_path)):
+        if not dry_run:
+            with open(poster_path, 'rb') as f:
+                write_if_changed(fanart_path, f.read())
+        changed.append(fanart_path)
+        artifacts['fanart'] = {'path': fanart_path, 'sha256': poster['sha256']}
+        status = 'updated'
+
+    if (changed or relinked) and not dry_run:
+        for kind in ('nfo', 'poster', 'fanart'):
+            record = artifacts.get(kind)
+            if record and (record['path'] in changed or record['path'] in relinked):
+                artifacts[kind] = artifact_record(record['path'], record['sha256'])
+        write_manifest(base_output_dir, info, artifacts, completed_at=manifest.get('completed_at'))
+        get_catalog().add(base_output_dir, info.to_dict(), artifacts, manifest.get('completed_at'))
+    return status, changed, relinked
+
+
+def rebuild_library(root, workers=DEFAULT_WORKERS, dry_run=False):
+    """用线程池重建 root 下所有视频的元数据，返回 {状态: 数量}"""
+    items = find_manifests(root)
+    counts = {'updated': 0, 'unchanged': 0, 'no_poster': 0, 'failed': 0}
+    print(f"📚 找到 {len(items)} 个任务清单")
+
+    def rebuild(item):
+        try:
+            return item, rebuild_item(*item, dry_run=dry_run), None
+        except Exception as e:
+            return item, None, e
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for (base, video_id), result, error in pool.map(rebuild, items):
+            if error is not None:
+                counts['failed'] += 1
+                print(f"❌ {video_id}: {error}")
+                continue
+            status, changed, relinked = result
+            counts[status] += 1
+            for path in changed:
+                print(f"{'📝 将更新' if dry_run else '✅ 已更新'}: {path}")
+            for path in relinked:
+                print(f"{'📝 将更新清单记录' if dry_run else '🔗 已更新清单记录'}: {path}")
+            if status == 'no_poster':
+                print(f"⚠️ {video_id}: 本地没有海报，需要重新下载")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="离线重建媒体库的 NFO 与海报")
+    parser.add_argument('root', help="下载目录（包含 .manifests 的输出根目录或其上级目录）")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="并发线程数")
+    parser.add_argument('--dry-run', action='store_true', help="只列出需要更新的文件，不写入")
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    counts = rebuild_library(args.root, args.workers, args.dry_run)
+    print(f"完成: 更新 {counts['updated']} 个，未变化 {counts['unchanged']} 个，"
+          f"缺少海报 {counts['no_poster']} 个，失败 {counts['failed']} 个，"
+          f"用时 {time.monotonic() - started:.1f}s")
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
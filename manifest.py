@@ -0,0 +1,158 @@
+"""任务产物清单
+
+每个视频完成后在 <输出根目录>/.manifests/<视频ID>.json 写入清单，记录视频信息、
+各产物（视频、字幕、NFO、海报）的路径、大小、修改时间、SHA-256 以及下载的格式ID。
+重新运行时只需读取清单并 stat 其中列出的文件即可判断是否已完成，
+无需请求YouTube，也不用扫描输出目录。
+"""
+import os
+import json
+import hashlib
+import time
+
+MANIFEST_DIRNAME = '.manifests'
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class HashingWriter:
+    """包装二进制文件对象，写入时同步计算 SHA-256 与字节数"""
+
+    def __init__(self, f):
+        self._f = f
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        return self._f.write(data)
+
+    def flush(self):
+        self._f.flush()
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+def hash_file(path, chunk_size=HASH_CHUNK_SIZE):
+    """分块读取文件计算 SHA-256（用于由 yt-dlp/ffmpeg 写出的文件）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_record(path, sha256=None, defer_hash=False, **extra):
+    """生成单个产物的记录；未提供 sha256 时分块计算
+
+    defer_hash 为 True 时暂不计算（用于大文件，避免在调度槽位内重新读取整个文件），
+    由 write_manifest 写入清单前补算。
+    """
+    stat = os.stat(path)
+    record = {
+        'path': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': sha256 or (None if defer_hash else hash_file(path)),
+    }
+    record.update({k: v for k, v in extra.items() if v is not None})
+    return record
+
+
+def manifest_path(base_output_dir, video_id):
+    return os.path.join(base_output_dir, MANIFEST_DIRNAME, f"{video_id}.json")
+
+
+def load_manifest(base_output_dir, video_id):
+    """读取清单，不存在或损坏时返回None；产物路径还原为绝对路径"""
+    if not video_id:
+        return None
+    path = manifest_path(base_output_dir, video_id)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    base = os.path.abspath(base_output_dir)
+    for record in iter_artifacts(manifest):
+        record['path'] = os.path.normpath(os.path.join(base, record['path']))
+    return manifest
+
+
+def write_manifest(base_output_dir, video_info, artifacts, completed_at=None):
+    """原子写入清单，产物路径保存为相对输出根目录的路径，返回清单文件路径
+
+    completed_at 默认为当前时间；改写已有清单（例如离线重建）时传入原来的完成时间。
+    """
+    if not video_info.video_id:
+        raise ValueError("缺少视频ID，无法写入清单")
+    base = os.path.abspath(base_output_dir)
+    # 补算延迟计算的哈希（结果同时写回 artifacts，之后重写清单时不再重复计算）
+    for record in iter_artifacts({'artifacts': artifacts}):
+        if not record.get('sha256'):
+            record['sha256'] = hash_file(record['path'])
+    stored = {}
+    for kind, value in artifacts.items():
+        records = value if isinstance(value, list) else [value]
+        records = [dict(r, path=os.path.relpath(r['path'], base)) for r in records if r]
+        stored[kind] = records if isinstance(value, list) else (records[0] if records else None)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'video_id': video_info.video_id,
+        'completed_at': completed_at or time.time(),
+        'info': video_info.to_dict(),
+        'artifacts': stored,
+    }
+    path = manifest_path(base, video_info.video_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.part"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+    return path
+
+
+def iter_artifacts(manifest):
+    for value in (manifest.get('artifacts') or {}).values():
+        for record in (value if isinstance(value, list) else [value]):
+            if record:
+                yield record
+
+
+def verify_manifest(manifest):
+    """只通过 stat 校验清单中的产物：视频必须存在，且所有产物大小与修改时间未变"""
+    if not manifest or manifest.get('version') != MANIFEST_VERSION:
+        return False
+    if not (manifest.get('artifacts') or {}).get('video'):
+        return False
+    for record in iter_artifacts(manifest):
+        try:
+            stat = os.stat(record['path'])
+        except OSError:
+            return False
+        if stat.st_size != record['size'] or stat.st_mtime_ns != record['mtime_ns']:
+            return False
+    return True
+
+
+def find_completed(base_output_dir, video_id):
+    """返回已完成且产物完整的清单，否则返回None"""
+    manifest = load_manifest(base_output_dir, video_id)
+    return manifest if verify_manifest(manifest) else None
+
+
+def find_manifests(root):
+    """遍历 root 下所有清单目录，返回 [(输出根目录, 视频ID)]"""
+    items = []
+    for dirpath, dirnames, _ in os.walk(root):
+        if MANIFEST_DIRNAME in dirnames:
+            manifest_dir = os.path.join(dirpath, MANIFEST_DIRNAME)
+            items.extend(
+                (dirpath, name[:-len('.json')])
+                for name in sorted(os.listdir(manifest_dir)) if name.endswith('.json')
+            )
+        # 不进入清单目录和其他隐藏目录
+        dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+    return items
@@ -0,0 +1,205 @@
+"""进程内监控指标，以 Prometheus 文本格式导出
+
+提供不依赖第三方库的 Counter / Gauge / Histogram，全部登记在模块级的 REGISTRY 中，
+Web端的 /metrics 调用 render() 输出。同名指标重复定义时返回已有的对象，
+因此各模块可以在导入时直接定义自己用到的指标。
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 默认的耗时分桶（秒），覆盖从毫秒级的元数据生成到数十分钟的视频下载
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        if not self.labelnames:
+            self._values[()] = self._initial_value()
+        self._function = None
+        self._lock = threading.Lock()
+
+    def _initial_value(self):
+        return 0
+
+    def set_function(self, function):
+        """导出时调用 function 取值：无标签时返回数值，有标签时返回 {标签值元组: 数值}"""
+        self._function = function
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，收到 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        """返回 [(后缀, 标签值, 额外标签, 数值)]"""
+        if self._function is not None:
+            values = self._function()
+            if not self.labelnames:
+                values = {(): values}
+            return [('', tuple(str(v) for v in key), (), value) for key, value in sorted(values.items())]
+        with self._lock:
+            return [('', key, (), value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        for suffix, key, extra, value in self._samples():
+            labels = _format_labels(self.labelnames, key, extra)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """只增不减的计数器；set_function 可导出其他组件自行累计的计数"""
+
+    TYPE = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("计数器不能减少")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """可增可减的当前值；设置 set_function 后在导出时调用函数取值"""
+
+    TYPE = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """分桶统计观测值的分布（累计桶 + 总和 + 次数）"""
+
+    TYPE = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _initial_value(self):
+        return {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = self._initial_value()
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['buckets'][index] += 1
+                    break
+            entry['sum'] += value
+            entry['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """记录 with 代码块的耗时（秒），代码块抛出异常时同样记录"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            items = sorted((key, dict(entry, buckets=list(entry['buckets'])))
+                           for key, entry in self._values.items())
+        for key, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry['buckets']):
+                cumulative += count
+                samples.append(('_bucket', key, (('le', _format_value(bound)),), cumulative))
+            samples.append(('_bucket', key, (('le', '+Inf'),), entry['count']))
+            samples.append(('_sum', key, (), entry['sum']))
+            samples.append(('_count', key, (), entry['count']))
+        return samples
+
+
+class Registry:
+    """按名称登记指标，render() 按登记顺序输出全部指标"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指标 {name} 已登记为 {metric.TYPE}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # 单个指标取值失败不影响其余指标的导出
+                lines.append(f"# {metric.name} 导出失败: {_escape(e)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+render = REGISTRY.render
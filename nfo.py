@@ -1,38 +1,133 @@
 import os
+import io
 import sys
 import shutil
-import requests
 import xml.etree.ElementTree as ET
 import re  # 用于正则表达式解析
 import subprocess
 import importlib.util
-import zipfile
-import tarfile
-import tempfile
-
-# 直接导入pip安装的yt-dlp
-try:
-    import yt_dlp
-    print("✓ 成功加载pip安装的yt-dlp")
-    
-    # 尝试快速获取版本信息
-    version_info = "版本信息不可用"
-    try:
-        from importlib.metadata import version
-        version_info = version('yt-dlp')
-    except:
-        try:
-            import pkg_resources
-            version_info = pkg_resources.get_distribution('yt-dlp').version
-        except:
-            pass
-    
-    print(f"✓ 版本: {version_info}")
-except ImportError as e:
-    print("❌ 未找到yt-dlp，请运行: pip install --pre yt-dlp")
-    print(f"错误详情: {e}")
-    # 不直接退出，让程序继续运行，在Web界面中提示用户安装
-    yt_dlp = None
+import copy
+from urllib.parse import urlsplit
+import time
+import threading
+from cache import get_metadata_cache, get_http_validator_cache
+from scheduler import StagePipeline
+from manifest import HashingWriter, artifact_record, write_manifest
+from catalog import find_downloaded, get_catalog
+from ratelimit import THROTTLE_STATUSES, get_rate_limiter, parse_retry_after, is_throttle_message
+from cookie_store import get_cookie_store
+import metrics
+from profiling import span, add_total, current_trace, use_trace
+from emby import get_emby_notifier
+
+# yt-dlp 体积较大，首次使用时才导入，避免拖慢 nfo / Web界面 / GUI 的启动
+_yt_dlp = None
+_yt_dlp_lock = threading.Lock()
+
+def load_yt_dlp():
+    """导入并返回pip安装的yt-dlp模块，未安装时抛出ImportError"""
+    global _yt_dlp
+    with _yt_dlp_lock:
+        if _yt_dlp is None:
+            try:
+                import yt_dlp
+            except ImportError as e:
+                print("❌ 未找到yt-dlp，请运行: pip install --pre yt-dlp")
+                raise ImportError("yt-dlp未安装，请运行: pip install --pre yt-dlp") from e
+            _yt_dlp = yt_dlp
+        return _yt_dlp
+
+_rate_limited_ydl = None
+_PLAYER_JS_RE = re.compile(r'/s/player/[^/]+/.+\.js')
+
+def get_youtube_dl_class():
+    """返回所有HTTP请求都经过共享限速器、并使用共享 cookie jar 的 YoutubeDL 子类
+
+    yt-dlp 的信息提取与下载器（包括分片下载）都通过 YoutubeDL.urlopen 发出请求，
+    在这里按 (主机, cookie账号) 取令牌，并把 429/403 响应反馈给限速器。
+    指定 cookiefile 时不再由每个实例重新解析文件，而是使用 CookieStore 中该账号的 jar，
+    关闭时由 CookieStore 在内容变化后原子写回。
+    """
+    global _rate_limited_ydl
+    yt_dlp = load_yt_dlp()
+    if _rate_limited_ydl is not None and issubclass(_rate_limited_ydl, yt_dlp.YoutubeDL):
+        return _rate_limited_ydl
+    from yt_dlp.networking.exceptions import HTTPError
+
+    class RateLimitedYoutubeDL(yt_dlp.YoutubeDL):
+        def __init__(self, params=None, *args, **kwargs):
+            params = dict(params or {})
+            self.cookie_account = params.get('cookiefile')
+            if self.cookie_account:
+                # cookiejar 是 cached_property，在初始化前放入共享 jar；
+                # 清空 cookiefile 使 yt-dlp 关闭时不再自行（非原子地）保存文件
+                self.__dict__['cookiejar'] = get_cookie_store().get_jar(self.cookie_account)
+                params['cookiefile'] = None
+            super().__init__(params, *args, **kwargs)
+
+        def close(self):
+            super().close()
+            if self.cookie_account:
+                try:
+                    get_cookie_store().save(self.cookie_account)
+                except OSError as e:
+                    print(f"⚠️ 写回cookie文件失败: {e}")
+
+        def urlopen(self, req):
+            url = req if isinstance(req, str) else getattr(req, 'url', None) or req.get_full_url()
+            limiter = get_rate_limiter(url, self.cookie_account)
+            waited = limiter.acquire()
+            if waited:
+                add_total('ratelimit_wait', waited)
+            started = time.monotonic()
+            try:
+                response = super().urlopen(req)
+            except HTTPError as e:
+                if e.status in THROTTLE_STATUSES:
+                    limiter.record_throttle(parse_retry_after(e.response.headers.get('Retry-After')))
+                raise
+            finally:
+                # 只统计到收到响应头为止；播放器JS单独统计，便于区分下载与签名解密的耗时
+                add_total('player_js' if _PLAYER_JS_RE.search(url or '') else 'http', time.monotonic() - started)
+            limiter.record_success()
+            return response
+
+    _rate_limited_ydl = RateLimitedYoutubeDL
+    return _rate_limited_ydl
+
+def record_throttle_error(url, cookie_file, error):
+    """yt-dlp 报错为人机验证/限流时通知限速器（HTTP 429/403 已在 urlopen 中记录）"""
+    if is_throttle_message(str(error)):
+        get_rate_limiter(url, cookie_file).record_throttle()
+
+# 监控指标（Web端通过 /metrics 导出）
+DOWNLOADED_BYTES = metrics.counter('yt2emby_downloaded_bytes_total', '已下载的媒体字节数')
+DOWNLOAD_SPEED = metrics.gauge('yt2emby_download_speed_bytes', '当前所有视频下载的总速度（字节/秒）')
+THUMBNAIL_SECONDS = metrics.histogram(
+    'yt2emby_thumbnail_fetch_seconds', '缩略图下载耗时（秒）', ('result',),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+FAILURES = metrics.counter('yt2emby_failures_total', '各阶段的失败次数（按原因分类）', ('stage', 'cause'))
+
+def failure_cause(error):
+    """把异常归类为监控用的失败原因"""
+    message = str(error).lower()
+    if is_throttle_message(message):
+        return 'throttled'
+    if isinstance(error, TimeoutError) or 'timed out' in message or 'timeout' in message:
+        return 'timeout'
+    if 'unavailable' in message or 'private video' in message or 'removed' in message:
+        return 'unavailable'
+    if 'http error' in message or 'server error' in message or 'client error' in message:
+        return 'http'
+    if isinstance(error, ConnectionError) or 'connection' in message:
+        return 'network'
+    if 'ffmpeg' in message or 'postprocess' in message:
+        return 'ffmpeg'
+    return 'other'
+
+def record_failure(stage, error):
+    FAILURES.inc(stage=stage, cause=failure_cause(error))
 
 def sanitize_filename(title):
     # 移除不允许的字符（Linux中主要是斜杠和空字符）
@@ -58,14 +153,123 @@ def sanitize_filename(title):
     
     return sanitized
 
-def get_video_info(url, cookie_file=None):
-    if yt_dlp is None:
-        raise ImportError("yt-dlp未安装，请运行: pip install --pre yt-dlp")
-    
+# 写入元数据缓存的字段（不含格式列表、原始信息等体积大或会过期的数据）
+CACHED_INFO_FIELDS = (
+    'video_id', 'title', 'description', 'uploader', 'publish_date',
+    'year', 'thumbnail_url', 'thumbnails', 'tags', 'url'
+)
+
+# 原始信息中下载阶段用不到、体积又很大的字段，以及上一次格式选择的结果
+# （复用时按本次的 format 重新选择，残留的 requested_formats 会覆盖单流下载的选择）
+_RAW_INFO_DROP_FIELDS = (
+    'heatmap', 'automatic_captions', 'chapters', 'comments',
+    'requested_formats', 'requested_downloads', 'requested_subtitles'
+)
+
+def trim_raw_info(info):
+    """裁剪 yt-dlp 原始信息：去掉热力图、自动字幕列表和故事板格式等大字段"""
+    trimmed = {k: v for k, v in info.items() if k not in _RAW_INFO_DROP_FIELDS}
+    if trimmed.get('formats'):
+        trimmed['formats'] = [
+            f for f in trimmed['formats']
+            if f.get('format_note') != 'storyboard' and f.get('protocol') != 'mhtml'
+        ]
+    return trimmed
+
+class VideoInfo:
+    """单个视频任务使用的精简信息
+
+    只保留下载与NFO生成需要的字段。raw 是裁剪后的 yt-dlp 信息字典，仅供下载阶段复用，
+    任务结束后应调用 release() 释放。artifacts 记录各阶段产物，用于写入任务清单。
+    同时兼容原来的字典式访问（info['title']、info.get()）。
+    """
+    __slots__ = CACHED_INFO_FIELDS + (
+        'cookiefile', 'video_format', 'raw', 'extract_seconds', 'reuse_saved_seconds', 'artifacts',
+        'connections', 'parallel_streams', 'download_stats'
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, None)
+        self.tags = []
+        self.thumbnails = []
+        self.video_format = 'mp4'
+        self.extract_seconds = 0.0
+        self.reuse_saved_seconds = 0.0
+        self.artifacts = {}
+        self.connections = DEFAULT_CONNECTIONS
+        self.parallel_streams = False
+        for name, value in fields.items():
+            self[name] = value
+
+    @classmethod
+    def from_dict(cls, data):
+        """从缓存/清单中的字典构造，忽略未知字段"""
+        return cls(**{k: v for k, v in data.items() if k in cls.__slots__})
+
+    def to_dict(self, fields=CACHED_INFO_FIELDS):
+        return {name: getattr(self, name) for name in fields}
+
+    def release(self):
+        """释放原始信息（任务完成后调用）"""
+        self.raw = None
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        if key not in self.__slots__:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def __repr__(self):
+        return f"VideoInfo(video_id={self.video_id!r}, title={self.title!r})"
+
+# 多连接下载：每个流的并发分片连接数（yt-dlp concurrent_fragment_downloads）
+DEFAULT_CONNECTIONS = 1
+MAX_CONNECTIONS = 16
+
+def normalize_connections(value):
+    """把连接数限制在 1..MAX_CONNECTIONS 之间，无效值按默认值处理"""
+    try:
+        return min(max(int(value), 1), MAX_CONNECTIONS)
+    except (TypeError, ValueError):
+        return DEFAULT_CONNECTIONS
+
+_YOUTUBE_ID_RE = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:[^#]*&)?v=|shorts/|live/|embed/)|youtu\.be/)([0-9A-Za-z_-]{11})'
+)
+
+def parse_video_id(url):
+    """从YouTube链接中解析视频ID，无法识别时返回None"""
+    m = _YOUTUBE_ID_RE.search(url or '')
+    return m.group(1) if m else None
+
+def get_video_info(url, cookie_file=None, use_cache=True):
     # 确保 URL 格式正确
-    if 'youtube.com/watch?v=' in url:
-        video_id = url.split('watch?v=')[-1].split('&')[0]
+    video_id = parse_video_id(url)
+    if video_id:
         url = f'https://www.youtube.com/watch?v={video_id}'
+    
+    # 优先使用本地缓存，避免重复请求YouTube
+    if use_cache and video_id:
+        try:
+            cached = get_metadata_cache().get(video_id)
+        except Exception as e:
+            print(f"⚠️ 读取元数据缓存失败: {e}")
+            cached = None
+        if cached:
+            print(f"♻️ 使用缓存的视频信息: {cached.get('title')}")
+            return VideoInfo.from_dict(cached)
+    load_yt_dlp()
     ydl_opts = {
         'quiet': True,
         'no_warnings': True,  # 禁用警告以隐藏PO Token警告
@@ -89,13 +293,16 @@ def get_video_info(url, cookie_file=None):
         },
     }
     try:
-        YoutubeDL = yt_dlp.YoutubeDL
+        YoutubeDL = get_youtube_dl_class()
         if cookie_file:
             print(f"ℹ️ Using cookie file: {ydl_opts['cookiefile']}")
         print(f"⌛ 正在获取视频信息: {url}")
         with YoutubeDL(ydl_opts) as ydl:
             print("📋 获取可用格式列表...")
-            info = ydl.extract_info(url, download=False)
+            extract_started = time.monotonic()
+            with span('info.extract'):
+                info = ydl.extract_info(url, download=False)
+            extract_seconds = time.monotonic() - extract_started
             if not info:
                 raise Exception("无法获取视频信息")
             print(f"\n📺 视频标题: {info.get('title', 'Unknown')}")
@@ -116,19 +323,29 @@ def get_video_info(url, cookie_file=None):
                         filesize = 'N/A'
                     print(f"ID: {format_id}, 格式: {ext}, 分辨率: {resolution}, 大小: {filesize}")
             upload_date = info.get('upload_date', '')
-            return {
-                'title': sanitize_filename(info.get('title', 'No Title')),
-                'description': info.get('description', ''),
-                'uploader': info.get('uploader', 'Unknown'),
-                'publish_date': f"{upload_date[:4]}-{upload_date[4:6]}-{upload_date[6:8]}" if upload_date else "",
-                'year': upload_date[:4] if upload_date else "",
-                'thumbnail_url': info.get('thumbnail', ''),
-                'tags': info.get('tags', []),
-                'url': url,
-                'formats': formats,
-                'original_info': info
-            }
+            video_info = VideoInfo(
+                video_id=info.get('id') or video_id,
+                title=sanitize_filename(info.get('title', 'No Title')),
+                description=info.get('description', ''),
+                uploader=info.get('uploader', 'Unknown'),
+                publish_date=f"{upload_date[:4]}-{upload_date[4:6]}-{upload_date[6:8]}" if upload_date else "",
+                year=upload_date[:4] if upload_date else "",
+                thumbnail_url=info.get('thumbnail', ''),
+                thumbnails=rank_thumbnails(info.get('thumbnails'))[:POSTER_CANDIDATES],
+                tags=info.get('tags', []),
+                url=url,
+                raw=trim_raw_info(info),
+                extract_seconds=extract_seconds
+            )
+            if use_cache and video_id:
+                try:
+                    get_metadata_cache().set(video_id, video_info.to_dict())
+                except Exception as e:
+                    print(f"⚠️ 写入元数据缓存失败: {e}")
+            return video_info
     except Exception as e:
+        record_throttle_error(url, cookie_file, e)
+        record_failure('info', e)
         print(f"❌ 下载失败: {str(e)}")
         print("\n💡 提示：")
         print("1. 检查视频 URL 是否完整")
@@ -139,23 +356,355 @@ def get_video_info(url, cookie_file=None):
         print(f"   yt-dlp --list-formats {url}")
         return None
 
-def download_video(info, output_dir):
-    if yt_dlp is None:
-        raise ImportError("yt-dlp未安装，请运行: pip install --pre yt-dlp")
-    
+_COLLECTION_URL_RE = re.compile(
+    r'youtube\.com/(?:playlist\?(?:[^#]*&)?list=|@[^/?#]+|channel/|c/|user/)'
+)
+
+# 频道同步时，连续遇到多少个已归档视频后停止列举（频道按发布时间倒序排列）
+DEFAULT_STOP_AFTER_KNOWN = 20
+ARCHIVE_FILENAME = '.yt2emby_archive.txt'
+
+def is_collection_url(url):
+    """是否为播放列表/频道链接（带 list 参数的 watch 链接仍按单个视频处理）"""
+    return bool(_COLLECTION_URL_RE.search(url or '')) and not parse_video_id(url)
+
+class DownloadArchive:
+    """已下载视频ID的持久化记录
+
+    文件格式与 yt-dlp 的 --download-archive 兼容（每行 "youtube <视频ID>"）。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ids = set()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 2:
+                        self._ids.add(parts[1])
+
+    def __contains__(self, video_id):
+        return video_id in self._ids
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, video_id):
+        if not video_id:
+            return
+        with self._lock:
+            if video_id in self._ids:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(f"youtube {video_id}\n")
+            self._ids.add(video_id)
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+def get_download_archive(path):
+    """按路径返回共享的 DownloadArchive 实例"""
+    path = os.path.abspath(path)
+    with _archives_lock:
+        if path not in _archives:
+            _archives[path] = DownloadArchive(path)
+        return _archives[path]
+
+def _iter_flat_entries(ydl, result, depth=0):
+    """递归展开扁平提取结果，逐条产出视频条目；子播放列表（如频道标签页）按需再列举"""
+    if not result or depth > 5:
+        return
+    result_type = result.get('_type', 'video')
+    if result_type in ('playlist', 'multi_video'):
+        for entry in result.get('entries') or []:
+            yield from _iter_flat_entries(ydl, entry, depth + 1)
+        return
+    video_id = parse_video_id(result.get('url')) or (result.get('id') if result_type == 'video' else None)
+    if video_id:
+        yield {'id': video_id, 'title': result.get('title'),
+               'url': f'https://www.youtube.com/watch?v={video_id}'}
+    elif result_type in ('url', 'url_transparent') and result.get('url'):
+        yield from _iter_flat_entries(
+            ydl, ydl.extract_info(result['url'], download=False, process=False), depth + 1
+        )
+
+def iter_collection_entries(url, cookie_file=None):
+    """以扁平提取方式逐条列出播放列表/频道中的视频
+
+    使用 process=False 直接迭代提取器返回的惰性 entries，按页请求，
+    不会一次性展开或获取每个视频的详细信息。
+    """
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': 'in_playlist',
+        'lazy_playlist': True,
+        'force_ipv4': True,
+        'socket_timeout': 60,
+        'cookiefile': os.path.expandvars(cookie_file.strip('"')) if cookie_file else None,
+        'http_headers': {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Accept-Language': 'en-US,en;q=0.9',
+        },
+    }
+    with get_youtube_dl_class()(ydl_opts) as ydl:
+        result = ydl.extract_info(url, download=False, process=False)
+        yield from _iter_flat_entries(ydl, result)
+
+def iter_new_videos(url, archive, cookie_file=None, stop_after_known=None):
+    """列出频道/播放列表中尚未归档的视频链接
+
+    频道按发布时间倒序排列，连续遇到 stop_after_known 个已归档视频即停止列举；
+    播放列表顺序不固定，默认完整列举（扁平提取，开销仍然很小）。
+    """
+    if stop_after_known is None:
+        stop_after_known = 0 if 'list=' in url else DEFAULT_STOP_AFTER_KNOWN
+    known_in_a_row = 0
+    listed = new = 0
+    print(f"⌛ 正在列举: {url}")
+    for entry in iter_collection_entries(url, cookie_file):
+        listed += 1
+        if entry['id'] in archive:
+            known_in_a_row += 1
+            if stop_after_known and known_in_a_row >= stop_after_known:
+                print(f"ℹ️ 连续 {known_in_a_row} 个视频已下载过，停止列举")
+                break
+            continue
+        known_in_a_row = 0
+        new += 1
+        print(f"🆕 新视频: {entry.get('title') or entry['id']}")
+        yield entry['url']
+    print(f"📋 列举完成：共检查 {listed} 个条目，新视频 {new} 个")
+
+def run_with_extracted_info(ydl, info):
+    """复用已提取的视频信息执行下载，避免每个阶段都重新提取（含播放器JS获取）
+
+    没有可复用的信息时退回按URL提取，并把本次提取结果保存下来供后续阶段复用。
+    """
+    if info.raw:
+        # process_ie_result 会原地修改信息字典，每个阶段使用独立副本
+        result = ydl.process_ie_result(copy.deepcopy(info.raw), download=True)
+        saved = info.extract_seconds or 0.0
+        info.reuse_saved_seconds += saved
+        print(f"♻️ 复用已提取的视频信息，跳过重复提取（约节省 {saved:.1f}s）")
+        return result
+    extract_started = time.monotonic()
+    result = ydl.extract_info(info.url, download=True)
+    info.raw = trim_raw_info(result)
+    info.extract_seconds = time.monotonic() - extract_started
+    return result
+
+PROGRESS_MIN_INTERVAL = 0.25  # 每个任务每秒最多通知4次进度
+
+class ProgressReporter:
+    """整理 yt-dlp progress_hooks 的回调，限流合并后通知调用方
+
+    回调频率很高，这里只保留最新状态：距上次通知不足 min_interval 时暂存，
+    由之后的回调或 flush() 发出；单个文件下载完成/出错时立即通知。
+    callback 接收一个精简的进度字典。
+    """
+
+    def __init__(self, callback, min_interval=PROGRESS_MIN_INTERVAL):
+        self._callback = callback
+        self._min_interval = min_interval
+        self._last_emit = 0.0
+        self._pending = None
+        self._file_bytes = {}  # 每个文件（视频流/音频流）已下载的字节数，并行下载时同时更新
+        self._lock = threading.Lock()
+
+    def hook(self, d):
+        """注册到 yt-dlp 的 progress_hooks"""
+        status = d.get('status')
+        downloaded = d.get('downloaded_bytes') or 0
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        record = {
+            'status': status,
+            'filename': os.path.basename(d.get('filename') or ''),
+            'downloaded_bytes': downloaded,
+            'total_bytes': total,
+            'percent': round(downloaded * 100 / total, 1) if total else None,
+            'speed': d.get('speed'),
+            'eta': d.get('eta'),
+            'fragment_index': d.get('fragment_index'),
+            'fragment_count': d.get('fragment_count'),
+        }
+        now = time.monotonic()
+        with self._lock:
+            name = d.get('filename') or ''
+            self._file_bytes[name] = max(self._file_bytes.get(name, 0), downloaded)
+            record['job_downloaded_bytes'] = sum(self._file_bytes.values())
+            if status != 'downloading' or now - self._last_emit >= self._min_interval:
+                self._pending = None
+                self._last_emit = now
+            else:
+                self._pending = record
+                return
+        self._callback(record)
+
+    def flush(self):
+        """发出尚未通知的最新进度"""
+        with self._lock:
+            record, self._pending = self._pending, None
+            if record:
+                self._last_emit = time.monotonic()
+        if record:
+            self._callback(record)
+
+class ThroughputMeter:
+    """统计单个任务的下载吞吐量：总字节数、网络耗时、平均与峰值速度
+
+    按文件分别累计，视频流与音频流并行下载时峰值速度为各流速度之和。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._files = {}  # 文件名 -> [已下载字节, 当前速度]
+        self.started = None
+        self.finished = None
+        self.peak_speed = 0.0
+
+    def hook(self, d):
+        """注册到 yt-dlp 的 progress_hooks"""
+        now = time.monotonic()
+        name = d.get('filename') or ''
+        with self._lock:
+            if self.started is None:
+                self.started = now
+            entry = self._files.setdefault(name, [0, 0.0])
+            downloaded = max(entry[0], d.get('downloaded_bytes') or 0)
+            delta, entry[0] = downloaded - entry[0], downloaded
+            entry[1] = (d.get('speed') or 0.0) if d.get('status') == 'downloading' else 0.0
+            self.peak_speed = max(self.peak_speed, sum(speed for _, speed in self._files.values()))
+            self.finished = now
+        if delta:
+            DOWNLOADED_BYTES.inc(delta)
+
+    def current_speed(self):
+        with self._lock:
+            return sum(speed for _, speed in self._files.values())
+
+    def stats(self, **extra):
+        with self._lock:
+            total = sum(downloaded for downloaded, _ in self._files.values())
+            seconds = (self.finished - self.started) if self.started is not None else 0.0
+            stats = {
+                'bytes': total,
+                'seconds': round(seconds, 2),
+                'average_speed': round(total / seconds) if seconds > 0 else None,
+                'peak_speed': round(self.peak_speed) or None,
+                'streams': len(self._files),
+            }
+        stats.update(extra)
+        return stats
+
+# 正在下载的任务的吞吐统计，用于导出当前总下载速度
+_active_meters = set()
+_active_meters_lock = threading.Lock()
+
+def _current_download_speed():
+    with _active_meters_lock:
+        meters = list(_active_meters)
+    return sum(meter.current_speed() for meter in meters)
+
+DOWNLOAD_SPEED.set_function(_current_download_speed)
+
+def format_throughput(stats):
+    """把吞吐量统计格式化为一行文字"""
+    average = stats.get('average_speed')
+    peak = stats.get('peak_speed')
+    return (f"{stats['bytes'] / 1024 / 1024:.1f}MB / {stats['seconds']:.1f}s，"
+            f"平均 {average / 1024 / 1024 if average else 0:.2f}MB/s，"
+            f"峰值 {peak / 1024 / 1024 if peak else 0:.2f}MB/s"
+            f"（{stats.get('connections', 1)} 连接/流，"
+            f"{'并行' if stats.get('parallel_streams') else '顺序'}下载 {stats['streams']} 个流）")
+
+def download_streams_parallel(info, ydl_opts, output_base, postprocessor_hooks=None):
+    """同时下载所选的视频流与音频流，再用 ffmpeg 合并为最终文件
+
+    yt-dlp 对 bestvideo+bestaudio 是逐个流顺序下载的，这里为每个流使用独立的 YoutubeDL
+    实例并行下载。所选格式不是视频+音频组合或找不到 ffmpeg 时返回 None，由常规流程下载。
+    返回值与 yt-dlp 的结果字典结构一致（format_id、requested_downloads）。
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    ffmpeg_path = get_ffmpeg_path()
+    if not ffmpeg_path:
+        print("⚠️ ffmpeg not found, falling back to sequential stream download")
+        return None
+    video_format = ydl_opts['merge_output_format']
+    with get_youtube_dl_class()(ydl_opts) as ydl:
+        if not info.raw:
+            extract_started = time.monotonic()
+            info.raw = trim_raw_info(ydl.extract_info(info.url, download=False))
+            info.extract_seconds = time.monotonic() - extract_started
+        selected = ydl.process_ie_result(copy.deepcopy(info.raw), download=False)
+    formats = selected.get('requested_formats') or []
+    if len(formats) != 2:
+        return None
+
+    final_path = f"{output_base}.{video_format}"
+    result = {
+        'format_id': selected.get('format_id'),
+        'requested_downloads': [{'filepath': final_path, 'format_id': selected.get('format_id')}],
+    }
+    if os.path.exists(final_path):
+        print(f"✅ Already downloaded: {final_path}")
+        return result
+
+    trace = current_trace()
+
+    def fetch(fmt):
+        opts = dict(ydl_opts, format=fmt['format_id'], outtmpl=f"{output_base}.f%(format_id)s.%(ext)s")
+        opts.pop('merge_output_format', None)
+        opts.pop('postprocessor_hooks', None)
+        with use_trace(trace), span(f"video.stream.{fmt['format_id']}"), \
+                get_youtube_dl_class()(opts) as stream_ydl:
+            stream = stream_ydl.process_ie_result(copy.deepcopy(info.raw), download=True)
+        downloads = stream.get('requested_downloads') or [stream]
+        return downloads[-1].get('filepath') or downloads[-1].get('_filename')
+
+    print(f"⌛ Downloading {len(formats)} streams in parallel: "
+          f"{', '.join(f['format_id'] for f in formats)}")
+    with ThreadPoolExecutor(max_workers=len(formats), thread_name_prefix='stream') as pool:
+        video_path, audio_path = pool.map(fetch, formats)
+
+    for hook in postprocessor_hooks or ():
+        hook({'status': 'started', 'postprocessor': 'Merger', 'info_dict': selected})
+    temp_path = f"{output_base}.temp.{video_format}"
+    print(f"⌛ Merging streams into {final_path}")
+    subprocess.run(
+        [ffmpeg_path, '-y', '-loglevel', 'error', '-i', video_path, '-i', audio_path,
+         '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', temp_path],
+        check=True, capture_output=True
+    )
+    os.replace(temp_path, final_path)
+    for path in (video_path, audio_path):
+        os.remove(path)
+    for hook in postprocessor_hooks or ():
+        hook({'status': 'finished', 'postprocessor': 'Merger', 'info_dict': selected})
+    return result
+
+def download_video(info, output_dir, postprocessor_hooks=None, progress_callback=None):
     try:
-        YoutubeDL = yt_dlp.YoutubeDL
+        YoutubeDL = get_youtube_dl_class()
         video_format = info.get('video_format', 'mp4')
+        connections = normalize_connections(info.get('connections', DEFAULT_CONNECTIONS))
+        output_base = os.path.join(output_dir, sanitize_filename(info['title']))
+        trace = current_trace()
+        if trace:
+            postprocessor_hooks = list(postprocessor_hooks or []) + [trace.postprocessor_hook]
         ydl_opts = {
             'format': 'bestvideo+bestaudio/best',  # 使用与命令行相同的简单格式选择
             'merge_output_format': video_format,
             'socket_timeout': 60,  # 增加超时时间
             'force_ipv4': True,  # 强制使用 IPv4
             'http_chunk_size': 10485760,  # 分块下载，优化网络请求（10MB）
+            'concurrent_fragment_downloads': connections,  # DASH/HLS 分片并发连接数
+            'continuedl': True,  # 沿用已有的 .part 文件断点续传
             'cookiefile': info.get('cookiefile'),
-            'outtmpl': os.path.join(output_dir, f"{sanitize_filename(info['title'])}.%(ext)s"),
-            'sleep_interval': 2,  # 每次请求间隔 2 秒
-            'max_sleep_interval': 5,  # 最大随机间隔 5 秒
+            'outtmpl': f"{output_base}.%(ext)s",
             'quiet': True,  # 安静模式
             'no_warnings': True,  # 禁用警告以隐藏PO Token警告
             'http_headers': {
@@ -172,23 +721,54 @@ def download_video(info, output_dir):
                 }
             },
         }
-        print(f"⌛ Downloading video as {video_format} ...")
-        with YoutubeDL(ydl_opts) as ydl:
-            ydl.download([info['url']])
-        downloaded_files = [f for f in os.listdir(output_dir) if f.startswith(sanitize_filename(info['title'])) and f.endswith(f".{video_format}")]
-        if not downloaded_files:
+        if postprocessor_hooks:
+            ydl_opts['postprocessor_hooks'] = list(postprocessor_hooks)
+        meter = ThroughputMeter()
+        with _active_meters_lock:
+            _active_meters.add(meter)
+        ydl_opts['progress_hooks'] = [meter.hook]
+        reporter = None
+        if progress_callback:
+            reporter = ProgressReporter(progress_callback)
+            ydl_opts['progress_hooks'].append(reporter.hook)
+        print(f"⌛ Downloading video as {video_format} ({connections} connections per stream) ...")
+        try:
+            result = None
+            with span('video.download'):
+                if info.get('parallel_streams'):
+                    result = download_streams_parallel(info, ydl_opts, output_base, postprocessor_hooks)
+                if result is None:
+                    with YoutubeDL(ydl_opts) as ydl:
+                        result = run_with_extracted_info(ydl, info)
+        finally:
+            with _active_meters_lock:
+                _active_meters.discard(meter)
+            if reporter:
+                reporter.flush()
+            info.download_stats = meter.stats(
+                connections=connections, parallel_streams=bool(info.get('parallel_streams'))
+            )
+        print(f"📶 Throughput: {format_throughput(info.download_stats)}")
+        # 使用 yt-dlp 返回的实际文件路径（合并后的最终文件），不再按文件名猜测
+        downloads = result.get('requested_downloads') or [result]
+        video_path = downloads[-1].get('filepath') or downloads[-1].get('_filename')
+        if not video_path or not os.path.exists(video_path):
             raise Exception("No video file found after download")
-        return downloaded_files[0]
+        # 哈希推迟到写入清单时计算：此时可能还占着唯一的 ffmpeg 合并槽位，
+        # 重新读取数GB的文件会让其他任务的合并排队等待
+        info.artifacts['video'] = artifact_record(
+            video_path, defer_hash=True, format_id=result.get('format_id') or downloads[-1].get('format_id')
+        )
+        return os.path.basename(video_path)
     except Exception as e:
+        record_throttle_error(info.url, info.get('cookiefile'), e)
+        record_failure('video', e)
         print(f"❌ Video download failed: {str(e)}")
         return None
 
 def download_subtitles(info, output_dir):
-    if yt_dlp is None:
-        raise ImportError("yt-dlp未安装，请运行: pip install --pre yt-dlp")
-    
     try:
-        YoutubeDL = yt_dlp.YoutubeDL
+        YoutubeDL = get_youtube_dl_class()
         ydl_opts = {
             'writesubtitles': True,  # 启用字幕下载
             'subtitleslangs': ['ja', 'zh-Hans', 'zh-Hant'],  # 优先下载日语和中文字幕
@@ -200,105 +780,295 @@ def download_subtitles(info, output_dir):
             'outtmpl': os.path.join(output_dir, f"{sanitize_filename(info['title'])}.%(ext)s"),
             'quiet': True,
             'no_warnings': True,
-            'sleep_interval': 2,  # 每次请求间隔 2 秒
-            'max_sleep_interval': 5,  # 最大随机间隔 5 秒
         }
         print("⌛ Downloading subtitles...")
-        with YoutubeDL(ydl_opts) as ydl:
-            ydl.download([info['url']])
+        with span('subtitles.download'), YoutubeDL(ydl_opts) as ydl:
+            result = run_with_extracted_info(ydl, info)
         found = False
-        sanitized_title = sanitize_filename(info['title'])
-        for file in os.listdir(output_dir):
-            if file.startswith(sanitized_title) and file.endswith(('.ass', '.srt', '.vtt')):
-                subtitle_path = os.path.join(output_dir, file)
-                subtitle_ext = os.path.splitext(file)[1]
-                m = re.match(rf"^{re.escape(sanitized_title)}\.([a-zA-Z\-]+){subtitle_ext}$", file)
-                lang = m.group(1) if m else None
-                if subtitle_ext == '.vtt':
-                    converted_file = os.path.splitext(subtitle_path)[0] + '.ass'
-                    vtt_to_ass(subtitle_path, converted_file)
-                    os.remove(subtitle_path)
-                    subtitle_path = converted_file
-                    subtitle_ext = '.ass'
-                if lang:
-                    new_name = f"{os.path.splitext(sanitized_title)[0]}.{lang}{subtitle_ext}"
-                else:
-                    new_name = f"{os.path.splitext(sanitized_title)[0]}{subtitle_ext}"
-                os.rename(subtitle_path, os.path.join(output_dir, new_name))
-                print(f"✅ Subtitle saved as: {new_name}")
-                found = True
+        subtitle_records = []
+        # yt-dlp 在 requested_subtitles 中返回每种语言字幕的实际保存路径
+        for lang, subtitle in (result.get('requested_subtitles') or {}).items():
+            subtitle_path = subtitle.get('filepath')
+            if not subtitle_path or not os.path.exists(subtitle_path):
+                continue
+            if subtitle_path.endswith('.vtt'):
+                converted_file = os.path.splitext(subtitle_path)[0] + '.ass'
+                vtt_to_ass(subtitle_path, converted_file)
+                os.remove(subtitle_path)
+                subtitle_path = converted_file
+            # 记录实际写出的文件格式（VTT 已转换为 ASS）
+            subtitle_format = os.path.splitext(subtitle_path)[1].lstrip('.').lower() or subtitle.get('ext')
+            subtitle_records.append(artifact_record(subtitle_path, lang=lang, format=subtitle_format))
+            print(f"✅ Subtitle saved as: {os.path.basename(subtitle_path)}")
+            found = True
+        info.artifacts['subtitles'] = subtitle_records
         if not found:
             print("⚠️ No subtitles found for this video.")
         return None
     except Exception as e:
+        record_throttle_error(info.url, info.get('cookiefile'), e)
+        record_failure('subtitles', e)
         print(f"⚠️ Failed to download subtitles: {str(e)}")
         return None
 
 def vtt_to_ass(vtt_path, ass_path):
-    """将 VTT 格式字幕转换为 ASS 格式"""
+    """将 VTT 格式字幕转换为 ASS 格式（流式转换，自动去除自动字幕的滚动重复行）"""
+    from subtitles import convert_vtt
     try:
-        import webvtt
-        from pysubs2 import SSAFile, SSAEvent
-        import subprocess
-        from . import get_ffmpeg_path
-
         print(f"⌛ Converting {vtt_path} to ASS format...")
-        subs = SSAFile()
-        for caption in webvtt.read(vtt_path):
-            start = caption.start_in_seconds * 1000  # 转换为毫秒
-            end = caption.end_in_seconds * 1000  # 转换为毫秒
-            text = caption.text.replace('\n', '\\N')  # 替换换行符为 ASS 格式的换行符
-            event = SSAEvent(start=start, end=end, text=text)
-            subs.events.append(event)  # 添加字幕事件
-        subs.save(ass_path)
-        print(f"✅ Converted to ASS: {ass_path}")
-    except ImportError as e:
-        print("⚠️ Missing required module. Please install dependencies:")
-        print("   pip install webvtt-py pysubs2")
-        raise e
+        with span('subtitles.convert'):
+            count = convert_vtt(vtt_path, ass_path, 'ass')
+        print(f"✅ Converted to ASS: {ass_path} ({count} events)")
     except Exception as e:
         print(f"⚠️ Failed to convert VTT to ASS: {str(e)}")
         raise e
 
-def generate_metadata_files(video_info, output_dir):
-    base_name = os.path.splitext(video_info['title'])[0]
-    thumbnail_path = os.path.join(output_dir, f"{base_name}-poster.jpg")
-    if video_info['thumbnail_url']:
+# 缩略图下载共用的HTTP会话（连接池复用TCP/TLS连接）
+_http_session = None
+_http_session_lock = threading.Lock()
+
+THUMBNAIL_CHUNK_SIZE = 64 * 1024
+THUMBNAIL_RETRIES = 4
+THUMBNAIL_BACKOFF = 1.0  # 首次重试等待秒数，之后按指数增长
+
+def get_http_session():
+    """返回进程内共享的 requests.Session"""
+    import requests
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = (
+                'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+            )
+            _http_session = session
+        return _http_session
+
+def download_thumbnail(url, path, retries=THUMBNAIL_RETRIES, backoff=THUMBNAIL_BACKOFF):
+    """流式下载缩略图，支持指数退避重试与 ETag/Last-Modified 条件请求
+
+    请求经过共享限速器，429 时按 Retry-After 暂停该主机的请求后重试。
+
+    返回 (状态, sha256)：状态为 'downloaded' 或 'not_modified'（服务器返回304，本地文件保持不变），
+    sha256 在写入时同步计算，未重新下载时为 None。
+    """
+    import requests
+    validators = get_http_validator_cache()
+    headers = {}
+    if os.path.exists(path):
+        etag, last_modified = validators.get(url, path)
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+    print(f"⌛ Downloading thumbnail from {url}")
+    session = get_http_session()
+    limiter = get_rate_limiter(url)
+    for attempt in range(retries):
+        limiter.acquire()
         try:
-            print(f"⌛ Downloading thumbnail from {video_info['thumbnail_url']}")
-            # 增加重试机制和超时设置
-            for attempt in range(3):  # 尝试最多 3 次
-                try:
-                    response = requests.get(video_info['thumbnail_url'], timeout=10)
-                    response.raise_for_status()
-                    with open(thumbnail_path, 'wb') as f:
-                        f.write(response.content)
-                    print(f"✅ Thumbnail saved to {thumbnail_path}")
-                    break
-                except requests.exceptions.RequestException as e:
-                    print(f"⚠️ Attempt {attempt + 1} failed: {str(e)}")
-                    if attempt == 2:  # 最后一次尝试失败
-                        raise
+            with session.get(url, headers=headers, timeout=10, stream=True) as response:
+                if response.status_code in THROTTLE_STATUSES:
+                    limiter.record_throttle(parse_retry_after(response.headers.get('Retry-After')))
+                else:
+                    limiter.record_success()
+                if response.status_code == 304:
+                    print(f"✅ Thumbnail not modified, keeping {path}")
+                    return 'not_modified', None
+                # 429 与 5xx 视为临时错误，其余 4xx 直接失败
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise requests.exceptions.HTTPError(
+                        f"{response.status_code} Server Error for url: {url}", response=response
+                    )
+                response.raise_for_status()
+                temp_path = f"{path}.part"
+                with open(temp_path, 'wb') as f:
+                    writer = HashingWriter(f)
+                    for chunk in response.iter_content(chunk_size=THUMBNAIL_CHUNK_SIZE):
+                        if chunk:
+                            writer.write(chunk)
+                os.replace(temp_path, path)
+                validators.set(
+                    url, path,
+                    response.headers.get('ETag'),
+                    response.headers.get('Last-Modified')
+                )
+            print(f"✅ Thumbnail saved to {path}")
+            return 'downloaded', writer.hexdigest()
+        except requests.exceptions.RequestException as e:
+            status = e.response.status_code if e.response is not None else None
+            retryable = status is None or status == 429 or status >= 500
+            print(f"⚠️ Attempt {attempt + 1} failed: {str(e)}")
+            if not retryable or attempt == retries - 1:  # 最后一次尝试失败
+                raise
+            if status != 429:  # 429 的等待由限速器负责
+                time.sleep(backoff * (2 ** attempt))
+
+# 海报：从 thumbnails 中按分辨率挑选，转换为限定宽度的 JPEG，同时写出 fanart.jpg
+POSTER_CANDIDATES = 3        # 最多依次尝试的候选缩略图数量（最高分辨率的可能不存在）
+POSTER_MAX_WIDTH = int(os.environ.get('YT2EMBY_POSTER_MAX_WIDTH', '1920'))
+POSTER_MAX_BYTES = 2 * 1024 * 1024
+POSTER_WORKERS = int(os.environ.get('YT2EMBY_POSTER_WORKERS', '2'))
+FANART_FILENAME = 'fanart.jpg'
+JPEG_MAGIC = b'\xff\xd8\xff'
+
+def _is_webp_url(url):
+    path = urlsplit(url).path.lower()
+    return path.endswith('.webp') or '/vi_webp/' in path
+
+def rank_thumbnails(thumbnails):
+    """按分辨率从高到低排列缩略图，分辨率相同时优先 JPEG，未知分辨率的按 preference 排在最后"""
+    ranked = sorted(
+        (t for t in thumbnails or () if t.get('url')),
+        key=lambda t: ((t.get('width') or 0) * (t.get('height') or 0),
+                       not _is_webp_url(t['url']), t.get('preference') or 0),
+        reverse=True
+    )
+    return [{'url': t['url'], 'width': t.get('width'), 'height': t.get('height')} for t in ranked]
+
+def convert_to_jpeg(source_path, target_path, max_width=POSTER_MAX_WIDTH):
+    """把图片转换为宽度不超过 max_width 的 JPEG（优先使用 Pillow，未安装时使用 ffmpeg）"""
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+    if Image is not None:
+        with Image.open(source_path) as image:
+            image = image.convert('RGB')
+            if image.width > max_width:
+                image = image.resize((max_width, round(image.height * max_width / image.width)))
+            image.save(target_path, 'JPEG', quality=90, optimize=True)
+        return
+    ffmpeg_path = get_ffmpeg_path()
+    if not ffmpeg_path:
+        raise RuntimeError("需要 Pillow 或 ffmpeg 才能转换海报格式")
+    subprocess.run(
+        [ffmpeg_path, '-y', '-loglevel', 'error', '-i', source_path,
+         '-vf', f"scale='min({max_width},iw)':-2", '-q:v', '3', '-f', 'image2', target_path],
+        check=True, capture_output=True
+    )
+
+def _poster_needs_conversion(path, width):
+    with open(path, 'rb') as f:
+        magic = f.read(len(JPEG_MAGIC))
+    return (magic != JPEG_MAGIC or os.path.getsize(path) > POSTER_MAX_BYTES
+            or (width or 0) > POSTER_MAX_WIDTH)
+
+def prepare_poster(video_info, output_dir):
+    """下载最佳候选缩略图并整理为 JPEG 海报和 fanart.jpg，返回产物记录 {'poster': ..., 'fanart': ...}
+
+    海报路径的 ETag/Last-Modified 对应原始缩略图，未修改（304）时保留已转换的文件。
+    """
+    _, poster_path = metadata_paths(video_info, output_dir)
+    fanart_path = os.path.join(output_dir, FANART_FILENAME)
+    candidates = list(video_info.get('thumbnails', []))
+    if not candidates and video_info['thumbnail_url']:
+        candidates = [{'url': video_info['thumbnail_url']}]
+    if not candidates:
+        return {}
+    started = time.monotonic()
+    error = None
+    for candidate in candidates:
+        try:
+            with span('metadata.thumbnail'):
+                status, sha256 = download_thumbnail(candidate['url'], poster_path)
+            break
         except Exception as e:
-            print(f"❌ Thumbnail download failed: {str(e)}")
+            error = e
+            print(f"⚠️ Thumbnail candidate failed: {candidate['url']} ({e})")
+    else:
+        THUMBNAIL_SECONDS.observe(time.monotonic() - started, result='failed')
+        raise error
+    THUMBNAIL_SECONDS.observe(time.monotonic() - started, result=status)
+
+    if status == 'downloaded' and _poster_needs_conversion(poster_path, candidate.get('width')):
+        temp_path = f"{poster_path}.tmp.jpg"
+        try:
+            with span('metadata.poster_convert'):
+                convert_to_jpeg(poster_path, temp_path)
+            os.replace(temp_path, poster_path)
+            sha256 = None
+            print(f"✅ Poster converted to JPEG: {poster_path}")
+        except Exception as e:
+            # 转换失败时保留原图（Emby 也能识别 WebP），不影响NFO与任务完成
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            print(f"⚠️ Poster conversion failed, keeping the original image: {e}")
+    if status == 'downloaded' or not os.path.exists(fanart_path):
+        shutil.copyfile(poster_path, f"{fanart_path}.part")
+        os.replace(f"{fanart_path}.part", fanart_path)
+    poster = artifact_record(poster_path, sha256)
+    return {'poster': poster, 'fanart': artifact_record(fanart_path, poster['sha256'])}
+
+_poster_pool = None
+_poster_pool_lock = threading.Lock()
+
+def _call_with_trace(trace, func, *args):
+    with use_trace(trace):
+        return func(*args)
+
+def start_poster(video_info, output_dir):
+    """把海报处理提交到独立的线程池（图片下载与转码不占用视频下载线程），返回 Future"""
+    global _poster_pool
+    from concurrent.futures import ThreadPoolExecutor
+    with _poster_pool_lock:
+        if _poster_pool is None:
+            _poster_pool = ThreadPoolExecutor(max_workers=max(1, POSTER_WORKERS), thread_name_prefix='poster')
+    return _poster_pool.submit(_call_with_trace, current_trace(), prepare_poster, video_info, output_dir)
+
+def metadata_paths(video_info, output_dir):
+    """返回 (NFO路径, 海报路径)"""
+    base_name = os.path.splitext(video_info['title'])[0]
+    return (os.path.join(output_dir, f"{base_name}.nfo"),
+            os.path.join(output_dir, f"{base_name}-poster.jpg"))
+
+def build_nfo_xml(video_info):
+    """生成 Emby NFO 文件的内容（UTF-8 编码的字节串）"""
+    root = ET.Element("movie")
+    ET.SubElement(root, "title").text = video_info['title']
+    ET.SubElement(root, "plot").text = video_info['description']
+    ET.SubElement(root, "premiered").text = video_info['publish_date']
+    ET.SubElement(root, "year").text = video_info['year']
+    ET.SubElement(root, "studio").text = "YouTube"
+
+    if video_info['uploader']:
+        director = ET.SubElement(root, "director")
+        director.text = video_info['uploader']
+    
+    for tag in video_info.get('tags', [])[:10]:
+        ET.SubElement(root, "tag").text = tag
+    buffer = io.BytesIO()
+    ET.ElementTree(root).write(buffer, encoding='utf-8', xml_declaration=True)
+    return buffer.getvalue()
+
+def generate_metadata_files(video_info, output_dir, poster=None):
+    """生成 NFO 并收集海报结果
+
+    poster 为 start_poster() 返回的 Future：获取视频信息后提前提交，海报与视频下载并行处理；
+    未提供时在这里提交并等待。
+    """
+    nfo_path, _ = metadata_paths(video_info, output_dir)
     try:
-        root = ET.Element("movie")
-        ET.SubElement(root, "title").text = video_info['title']
-        ET.SubElement(root, "plot").text = video_info['description']
-        ET.SubElement(root, "premiered").text = video_info['publish_date']
-        ET.SubElement(root, "year").text = video_info['year']
-        ET.SubElement(root, "studio").text = "YouTube"
-
-        if video_info['uploader']:
-            director = ET.SubElement(root, "director")
-            director.text = video_info['uploader']
-        
-        for tag in video_info.get('tags', [])[:10]:
-            ET.SubElement(root, "tag").text = tag
-        nfo_path = os.path.join(output_dir, f"{base_name}.nfo")
-        ET.ElementTree(root).write(nfo_path, encoding='utf-8', xml_declaration=True)
+        video_info.artifacts.update((poster or start_poster(video_info, output_dir)).result())
+    except Exception as e:
+        record_failure('thumbnail', e)
+        print(f"❌ Thumbnail download failed: {str(e)}")
+    try:
+        temp_path = f"{nfo_path}.part"
+        with span('metadata.nfo'):
+            with open(temp_path, 'wb') as f:
+                writer = HashingWriter(f)
+                writer.write(build_nfo_xml(video_info))
+            os.replace(temp_path, nfo_path)
+        video_info.artifacts['nfo'] = artifact_record(nfo_path, writer.hexdigest())
         print(f"✅ NFO file generated: {nfo_path}")
     except Exception as e:
+        record_failure('metadata', e)
         print(f"❌ NFO generation failed: {str(e)}")
 
 def get_ffmpeg_path():
@@ -317,11 +1087,29 @@ def check_ffmpeg_installed():
         return False
     return True
 
-def get_current_ytdlp_version():
-    """获取当前pip安装的yt-dlp版本"""
+# 版本号缓存：只在首次查询和更新yt-dlp后重新探测
+_ytdlp_version = None
+_ytdlp_version_lock = threading.Lock()
+
+def get_current_ytdlp_version(refresh=False):
+    """获取当前pip安装的yt-dlp版本（结果缓存在进程内，更新yt-dlp后失效）"""
+    global _ytdlp_version
+    with _ytdlp_version_lock:
+        if _ytdlp_version is None or refresh:
+            _ytdlp_version = _probe_ytdlp_version()
+        return _ytdlp_version
+
+def invalidate_ytdlp_version_cache():
+    """清除缓存的版本号，下次查询时重新探测"""
+    global _ytdlp_version
+    with _ytdlp_version_lock:
+        _ytdlp_version = None
+
+def _probe_ytdlp_version():
+    """在当前进程内探测yt-dlp版本（不启动子进程）"""
     try:
-        # 检查yt_dlp是否可用
-        if yt_dlp is None:
+        # 检查yt_dlp是否已安装（不导入模块本身）
+        if importlib.util.find_spec('yt_dlp') is None:
             return "未安装"
         
         # 方法1：使用importlib.metadata (Python 3.8+) - 最可靠
@@ -342,26 +1130,7 @@ def get_current_ytdlp_version():
         except Exception as e:
             print(f"pkg_resources失败: {e}")
         
-        # 方法3：使用subprocess调用yt-dlp --version
-        try:
-            result = subprocess.run([sys.executable, '-m', 'yt_dlp', '--version'], 
-                                  capture_output=True, text=True, timeout=10)
-            if result.returncode == 0:
-                ver = result.stdout.strip()
-                print(f"✓ 命令行获取版本: {ver}")
-                return ver
-            else:
-                print(f"命令行调用失败: {result.stderr}")
-        except Exception as e:
-            print(f"命令行调用异常: {e}")
-        
-        # 方法4：直接从模块获取（通常不可用）
-        if hasattr(yt_dlp, '__version__'):
-            ver = yt_dlp.__version__
-            print(f"✓ 模块属性获取版本: {ver}")
-            return ver
-        
-        # 方法5：尝试从version模块获取
+        # 方法3：尝试从version模块获取
         try:
             from yt_dlp import version as ytdlp_version
             if hasattr(ytdlp_version, '__version__'):
@@ -379,6 +1148,7 @@ def get_current_ytdlp_version():
 
 def update_ytdlp_nightly(log_func=print):
     """更新yt-dlp到nightly版本"""
+    global _yt_dlp
     try:
         log_func("正在更新yt-dlp到nightly版本...")
         
@@ -390,10 +1160,13 @@ def update_ytdlp_nightly(log_func=print):
         
         if result.returncode == 0:
             log_func("✓ yt-dlp nightly版本更新成功")
+            invalidate_ytdlp_version_cache()
             
-            # 重新导入模块以获取新版本
-            import importlib
-            importlib.reload(yt_dlp)
+            # 已导入过的模块需要重新导入以使用新版本
+            with _yt_dlp_lock:
+                if _yt_dlp is not None:
+                    import importlib
+                    _yt_dlp = importlib.reload(_yt_dlp)
             
             new_version = get_current_ytdlp_version()
             log_func(f"新版本: {new_version}")
@@ -420,6 +1193,107 @@ def update_ytdlp():
         except Exception as e:
             print(f"❌ yt-dlp 更新失败: {e}")
 
+def run_batch(urls, base_output_dir, cookie_path=None, video_format='mp4', download_workers=1, archive=None,
+              connections=DEFAULT_CONNECTIONS, parallel_streams=False):
+    """以流水线方式批量处理链接：获取信息 → 下载视频和字幕 → 生成元数据
+
+    各阶段由独立线程处理并通过有界队列衔接，第N+1个视频的信息获取可以与
+    第N个视频的下载以及第N-1个视频的元数据生成同时进行。urls 可以是惰性的迭代器。
+    传入 archive 时跳过已归档的视频，并在完成后记录到归档中。
+    已有完整任务清单（.manifests/<视频ID>.json）的视频直接跳过，不发起任何网络请求。
+    connections / parallel_streams 控制每个视频的分片并发连接数与是否并行下载音视频流。
+    配置了 Emby 时，完成的视频目录会合并为一次定向刷新请求。
+    """
+    emby = get_emby_notifier()
+    seen_ids = set()  # 同一批次中重复出现的视频只处理一次，避免并发下载到同一目录
+
+    def fetch_info(youtube_url):
+        if not youtube_url.startswith(('http://', 'https://')):
+            print(f"❌ Invalid URL format: {youtube_url}")
+            return None
+        video_id = parse_video_id(youtube_url)
+        if video_id in seen_ids:
+            print(f"⏭️ Duplicate in this batch, skipping: {youtube_url}")
+            return None
+        if video_id:
+            seen_ids.add(video_id)
+        if archive is not None and video_id in archive:
+            print(f"⏭️ Already downloaded, skipping: {youtube_url}")
+            return None
+        if find_downloaded(base_output_dir, video_id):
+            print(f"⏭️ Already in the library, skipping: {youtube_url}")
+            return None
+
+        job_started = time.monotonic()
+        video_info = get_video_info(youtube_url, cookie_path)
+        if not video_info:
+            print("❌ Failed to fetch metadata")
+            return None
+        video_info['cookiefile'] = cookie_path
+        video_info['video_format'] = video_format   # 传递格式信息
+        video_info['connections'] = connections
+        video_info['parallel_streams'] = parallel_streams
+
+        output_dir = os.path.join(base_output_dir, video_info['title'])
+        os.makedirs(output_dir, exist_ok=True)
+        print(f"📁 Created output folder: {output_dir}")
+        return {'info': video_info, 'output_dir': output_dir, 'started': job_started,
+                'poster': start_poster(video_info, output_dir)}
+
+    def download(job):
+        video_filename = download_video(job['info'], job['output_dir'])
+        if not video_filename:
+            print(f"❌ Failed to download video: {job['info']['title']}")
+            return None
+        job['video_filename'] = video_filename
+
+        # 下载字幕
+        download_subtitles(job['info'], job['output_dir'])
+        return job
+
+    def write_metadata(job):
+        video_info, output_dir = job['info'], job['output_dir']
+        generate_metadata_files(video_info, output_dir, job['poster'])
+        print("\n🎉 Success! Files created:")
+        print(f"- Video: {os.path.join(output_dir, job['video_filename'])}")
+        print(f"- Metadata: {os.path.join(output_dir, video_info['title'])}.nfo")
+        print(f"- Thumbnail: {os.path.join(output_dir, video_info['title'])}-poster.jpg")
+        try:
+            print(f"- Manifest: {write_manifest(base_output_dir, video_info, video_info.artifacts)}")
+        except Exception as e:
+            print(f"⚠️ Failed to write manifest: {e}")
+        try:
+            get_catalog().add(base_output_dir, video_info.to_dict(), video_info.artifacts)
+        except Exception as e:
+            print(f"⚠️ Failed to add to the library catalog: {e}")
+        if emby:
+            emby.notify(output_dir)
+        print(f"⏱️ Job time: {time.monotonic() - job['started']:.1f}s "
+              f"(saved ~{video_info.get('reuse_saved_seconds', 0.0):.1f}s by reusing extracted info)")
+        if archive is not None:
+            archive.add(video_info.video_id)
+        video_info.release()
+        return job
+
+    pipeline = StagePipeline([
+        ('info', fetch_info, 1),
+        ('download', download, download_workers),
+        ('metadata', write_metadata, 1),
+    ])
+    completed = pipeline.run(urls)
+    if emby:
+        emby.flush()
+    print("\n📊 批量处理统计:")
+    print(pipeline.summary())
+    stats = [job['info'].download_stats for job in completed if job['info'].download_stats]
+    if stats:
+        total_bytes = sum(s['bytes'] for s in stats)
+        total_seconds = sum(s['seconds'] for s in stats)
+        print(f"  - 下载吞吐: 共 {total_bytes / 1024 / 1024:.1f}MB，单任务平均 "
+              f"{total_bytes / total_seconds / 1024 / 1024 if total_seconds else 0:.2f}MB/s"
+              f"（{connections} 连接/流，{'并行' if parallel_streams else '顺序'}下载音视频流）")
+    return completed
+
 def main():
     update_ytdlp()
     print("====== YouTube to Emby Metadata Tool ======")
@@ -429,7 +1303,19 @@ def main():
     print("请选择输入方式：")
     print("1. 单个链接")
     print("2. 批量链接（txt文件，每行一个链接）")
-    input_mode = input("输入 1 或 2（默认1）: ").strip() or "1"
+    print("3. 频道/播放列表同步（只下载新视频）")
+    print("4. 重建媒体库的NFO和海报（离线，不下载）")
+    input_mode = input("输入 1、2、3 或 4（默认1）: ").strip() or "1"
+
+    collection_url = None
+
+    if input_mode == "4":
+        from library import rebuild_library
+        library_dir = input("下载目录 (默认: ./downloads): ").strip() or "./downloads"
+        counts = rebuild_library(library_dir)
+        print(f"📊 更新 {counts['updated']} 个，未变化 {counts['unchanged']} 个，"
+              f"缺少海报 {counts['no_poster']} 个，失败 {counts['failed']} 个")
+        return
 
     if input_mode == "2":
         default_links_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "links.txt")
@@ -439,6 +1325,11 @@ def main():
             return
         with open(txt_path, "r", encoding="utf-8") as f:
             urls = [line.strip() for line in f if line.strip()]
+    elif input_mode == "3":
+        collection_url = input("请输入频道或播放列表链接: ").strip()
+        if not is_collection_url(collection_url):
+            print("❌ 不是有效的频道或播放列表链接")
+            return
     else:
         youtube_url = input("Enter YouTube URL: ").strip()
         urls = [youtube_url]
@@ -477,35 +1368,23 @@ def main():
     else:
         video_format = "mp4"
 
-    for youtube_url in urls:
-        if not youtube_url.startswith(('http://', 'https://')):
-            print(f"❌ Invalid URL format: {youtube_url}")
-            continue
-
-        video_info = get_video_info(youtube_url, cookie_path)
-        if not video_info:
-            print("❌ Failed to fetch metadata")
-            continue
-        video_info['cookiefile'] = cookie_path
-        video_info['video_format'] = video_format   # 传递格式信息
-
-        output_dir = os.path.join(base_output_dir, video_info['title'])
-        os.makedirs(output_dir, exist_ok=True)
-        print(f"📁 Created output folder: {output_dir}")
+    download_workers = 1
+    if input_mode in ("2", "3"):
+        download_workers = int(input("并行下载数（默认1）: ").strip() or "1")
+    connections = normalize_connections(
+        input(f"每个流的下载连接数（1-{MAX_CONNECTIONS}，默认{DEFAULT_CONNECTIONS}）: ").strip() or DEFAULT_CONNECTIONS
+    )
+    parallel_streams = (input("同时下载视频流和音频流？(y/N): ").strip().lower() == "y")
 
-        video_filename = download_video(video_info, output_dir)
-        if not video_filename:
-            print("❌ Failed to download video")
-            continue
-
-        # 下载字幕
-        download_subtitles(video_info, output_dir)
+    archive = None
+    if collection_url:
+        # 归档文件记录已下载的视频ID，每次同步只处理新视频
+        archive = get_download_archive(os.path.join(base_output_dir, ARCHIVE_FILENAME))
+        print(f"📚 已归档视频: {len(archive)} 个")
+        urls = iter_new_videos(collection_url, archive, cookie_path)
 
-        generate_metadata_files(video_info, output_dir)
-        print("\n🎉 Success! Files created:")
-        print(f"- Video: {os.path.join(output_dir, video_filename)}")
-        print(f"- Metadata: {os.path.join(output_dir, video_info['title'])}.nfo")
-        print(f"- Thumbnail: {os.path.join(output_dir, video_info['title'])}-poster.jpg")
+    run_batch(urls, base_output_dir, cookie_path, video_format, download_workers, archive,
+              connections, parallel_streams)
 
 if __name__ == "__main__":
     main()
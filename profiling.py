@@ -0,0 +1,150 @@
+"""单个任务的耗时分段与性能分析
+
+JobTrace 记录一个任务内各阶段的耗时（信息提取、下载、合并、字幕转换、NFO写入等）
+以及HTTP请求、限速等待等累计耗时。当前任务的 trace 保存在线程局部变量中，
+nfo.py 中的 span() 在未启用 trace 的线程上不做任何事，默认没有额外开销。
+
+profile_job() 为单个任务开启 cProfile，结果保存为 .prof 文件，可用
+`python -m pstats` 或 snakeviz 等工具查看。
+"""
+import os
+import io
+import cProfile
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+_local = threading.local()
+# Python 3.12 起同一时间只能有一个 cProfile 处于启用状态
+_profile_lock = threading.Lock()
+
+
+class JobTrace:
+    """一个任务的耗时记录：spans 为各阶段（可嵌套），totals 为多次发生的操作的累计值"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.spans = []
+        self.totals = {}
+        self._postprocess_started = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name, started, seconds):
+        with self._lock:
+            self.spans.append({
+                'name': name,
+                'start': round(started - self.started, 4),
+                'seconds': round(seconds, 4),
+                'thread': threading.current_thread().name,
+            })
+
+    def add_total(self, name, seconds):
+        with self._lock:
+            entry = self.totals.setdefault(name, {'count': 0, 'seconds': 0.0})
+            entry['count'] += 1
+            entry['seconds'] += seconds
+
+    def postprocessor_hook(self, d):
+        """注册到 yt-dlp 的 postprocessor_hooks，记录合并/转换等后处理的耗时"""
+        name = d.get('postprocessor')
+        if d.get('status') == 'started':
+            with self._lock:
+                self._postprocess_started[name] = time.monotonic()
+        elif d.get('status') == 'finished':
+            with self._lock:
+                started = self._postprocess_started.pop(name, None)
+            if started is not None:
+                self.add_span(f"postprocess.{name}", started, time.monotonic() - started)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'elapsed': round(time.monotonic() - self.started, 4),
+                'spans': sorted(self.spans, key=lambda span: span['start']),
+                'totals': {
+                    name: {'count': entry['count'], 'seconds': round(entry['seconds'], 4)}
+                    for name, entry in self.totals.items()
+                },
+            }
+
+    def format_lines(self):
+        """按开始时间输出每个阶段一行的文字摘要"""
+        data = self.to_dict()
+        lines = [f"{span['name']}: {span['seconds']:.3f}s (+{span['start']:.3f}s)" for span in data['spans']]
+        lines.extend(
+            f"{name}: {entry['seconds']:.3f}s / {entry['count']} 次" for name, entry in data['totals'].items()
+        )
+        return lines
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def use_trace(trace):
+    """在当前线程上启用 trace（trace 为 None 时不记录），结束后恢复之前的 trace"""
+    previous = current_trace()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+@contextmanager
+def span(name):
+    """记录代码块的耗时；当前线程没有 trace 时直接执行"""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        trace.add_span(name, started, time.monotonic() - started)
+
+
+def add_total(name, seconds):
+    trace = current_trace()
+    if trace is not None:
+        trace.add_total(name, seconds)
+
+
+def profile_path(job_id):
+    return os.path.join(PROFILE_DIR, f"{job_id}.prof")
+
+
+@contextmanager
+def profile_job(job_id):
+    """对当前线程开启 cProfile，结束后写入 profile_path(job_id)
+
+    yield 输出文件路径；已有其他任务正在采集时不采集，yield None。
+    只分析调用线程，yt-dlp 内部的分片下载线程不在结果中。
+    """
+    if not _profile_lock.acquire(blocking=False):
+        yield None
+        return
+    path = profile_path(job_id)
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            yield path
+        finally:
+            profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(path)
+    finally:
+        _profile_lock.release()
+
+
+def top_functions(path, limit=10, sort='cumulative'):
+    """返回 .prof 文件中耗时最多的函数（pstats 文本格式）"""
+    buffer = io.StringIO()
+    pstats.Stats(path, stream=buffer).strip_dirs().sort_stats(sort).print_stats(limit)
+    return buffer.getvalue()
@@ -0,0 +1,158 @@
+"""共享的自适应请求限速
+
+进程内所有任务共用按 (主机, cookie账号) 区分的令牌桶，取代每个 YoutubeDL 实例各自固定的
+sleep_interval：请求正常时速率按加性增长逐步提高，收到 429/403 或人机验证时按乘性减小
+并在 Retry-After 指定的时间内暂停该主机的请求（AIMD）。
+"""
+import os
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from cookie_store import normalize_cookie_path
+
+THROTTLE_STATUSES = (403, 429)
+
+# 默认速率（请求/秒），可通过环境变量调整
+DEFAULT_RATE = float(os.environ.get('YT2EMBY_REQUEST_RATE', '2'))
+DEFAULT_MAX_RATE = float(os.environ.get('YT2EMBY_MAX_REQUEST_RATE', '10'))
+DEFAULT_MIN_RATE = 0.05  # 最慢每20秒一个请求
+
+# 个别主机的参数：媒体分片主机请求数多，起始速率与突发量更高
+HOST_PROFILES = {
+    'googlevideo.com': {'rate': 8.0, 'burst': 16, 'max_rate': 50.0},
+}
+
+_THROTTLE_MESSAGE_RE = re.compile(
+    r"HTTP Error (?:403|429)|Too Many Requests|confirm you.re not a bot", re.IGNORECASE
+)
+
+
+class AdaptiveTokenBucket:
+    """AIMD 调整速率的令牌桶
+
+    acquire() 预占一个令牌，不足时等待；record_success() 每次把速率提高 increase/rate
+    （稳定时约每秒提高 increase）；record_throttle() 把速率乘以 decrease 并暂停到
+    Retry-After 之后，同一次退避期间的多个失败只计一次。
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=4, min_rate=DEFAULT_MIN_RATE,
+                 max_rate=DEFAULT_MAX_RATE, increase=0.5, decrease=0.5):
+        self.max_rate = max(max_rate, min_rate)
+        self.min_rate = min_rate
+        self.rate = min(max(rate, min_rate), self.max_rate)
+        self.burst = max(1, burst)
+        self.increase = increase
+        self.decrease = decrease
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def acquire(self):
+        """占用一个令牌，必要时阻塞等待，返回等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = max(0.0, -self._tokens / self.rate, self._blocked_until - now)
+            self.requests += 1
+            self.wait_seconds += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def record_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def record_throttle(self, retry_after=None):
+        """收到限流响应：降低速率并暂停，retry_after 为服务器要求的等待秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self.throttled += 1
+            if now < self._blocked_until:
+                return
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+            self._blocked_until = now + max(retry_after or 0.0, 1.0 / self.rate)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'rate': round(self.rate, 3),
+                'requests': self.requests,
+                'throttled': self.throttled,
+                'wait_seconds': round(self.wait_seconds, 2),
+                'blocked_for': round(max(0.0, self._blocked_until - time.monotonic()), 2),
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def host_key(url):
+    """取主机名的最后两级作为限速键，例如 rr1---sn-x.googlevideo.com -> googlevideo.com"""
+    host = (urlsplit(url).hostname or '').lower()
+    if ':' in host or host.replace('.', '').isdigit():  # IP地址保持原样
+        return host
+    parts = host.split('.')
+    return '.'.join(parts[-2:]) if len(parts) > 2 else host
+
+
+def account_key(cookie_file):
+    """cookie 文件对应的账号标识，未使用 cookie 时为 anonymous
+
+    调用方传入的路径写法不一（是否展开环境变量、带引号、相对路径），统一规范化，
+    避免同一账号分到两个限速桶而使实际速率翻倍。
+    """
+    return normalize_cookie_path(cookie_file) if cookie_file else 'anonymous'
+
+
+def get_rate_limiter(url, cookie_file=None):
+    """返回 (主机, cookie账号) 对应的共享限速器"""
+    key = (host_key(url), account_key(cookie_file))
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = AdaptiveTokenBucket(**HOST_PROFILES.get(key[0], {}))
+        return limiter
+
+
+def limiter_snapshots():
+    """所有限速器的当前状态，键为 (主机, 账号)"""
+    with _limiters_lock:
+        items = list(_limiters.items())
+    return {key: limiter.snapshot() for key, limiter in items}
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 头（秒数或HTTP日期），无法解析时返回None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttle_message(message):
+    """错误信息是否表示被限流（429/403 或 YouTube 人机验证）"""
+    return bool(_THROTTLE_MESSAGE_RE.search(message or ''))
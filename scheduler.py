@@ -0,0 +1,268 @@
+"""下载任务调度器
+
+为 /api/download 提供有界的工作线程池、FIFO等待队列以及按阶段的并发限制，
+避免一次提交大量链接时同时发起过多的网络下载与ffmpeg合并；
+另提供批量模式使用的分阶段流水线 StagePipeline。
+"""
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import contextmanager
+
+# 默认的分阶段并发限制（None 或 0 表示不限制）
+DEFAULT_STAGE_LIMITS = {
+    'network': 2,  # yt-dlp 信息提取 / 视频与字幕下载
+    'merge': 1,    # ffmpeg 合并音视频
+}
+
+
+class StageSlot:
+    """任务当前占用的阶段槽位，可在阶段之间切换"""
+
+    def __init__(self, scheduler):
+        self._scheduler = scheduler
+        self.stage = None
+
+    def switch(self, stage):
+        """释放当前阶段槽位并占用新阶段的槽位（会阻塞直到有空闲槽位）"""
+        if stage == self.stage:
+            return
+        self.release()
+        semaphore = self._scheduler._semaphores.get(stage)
+        if semaphore is not None:
+            semaphore.acquire()
+        self.stage = stage
+
+    def release(self):
+        if self.stage is None:
+            return
+        semaphore = self._scheduler._semaphores.get(self.stage)
+        if semaphore is not None:
+            semaphore.release()
+        self.stage = None
+
+    def ytdlp_postprocessor_hook(self, d):
+        """yt-dlp postprocessor hook：合并开始时让出网络槽位并占用合并槽位"""
+        if d.get('status') == 'started' and d.get('postprocessor') == 'Merger':
+            self.switch('merge')
+
+
+class DownloadScheduler:
+    """固定大小的工作线程池 + FIFO等待队列 + 分阶段并发限制"""
+
+    def __init__(self, max_workers=3, stage_limits=None, on_queue_change=None):
+        self.max_workers = max(1, int(max_workers))
+        limits = dict(DEFAULT_STAGE_LIMITS)
+        limits.update(stage_limits or {})
+        self._semaphores = {
+            stage: threading.BoundedSemaphore(int(limit))
+            for stage, limit in limits.items() if limit
+        }
+        self.stage_limits = limits
+        # on_queue_change() 在任务出队时由工作线程调用，只应做轻量的通知（例如唤醒刷新排队位置的线程），
+        # 排队位置通过 pending_ids() 获取
+        self._on_queue_change = on_queue_change
+        self._pending = deque()
+        self._running = set()
+        self._cond = threading.Condition()
+        self._workers = []
+        self._shutdown = False
+
+    def start(self):
+        """启动工作线程（重复调用无副作用）"""
+        with self._cond:
+            if self._workers:
+                return
+            for i in range(self.max_workers):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"download-worker-{i + 1}",
+                    daemon=True
+                )
+                self._workers.append(worker)
+                worker.start()
+
+    def shutdown(self):
+        """停止接收新任务，空闲的工作线程会退出"""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+
+    def submit(self, job_id, func, *args, **kwargs):
+        """提交任务，返回其在等待队列中的位置（从1开始）"""
+        self.start()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("调度器已关闭")
+            self._pending.append((job_id, func, args, kwargs))
+            position = len(self._pending)
+            self._cond.notify()
+        return position
+
+    def queue_position(self, job_id):
+        """任务在等待队列中的位置，不在队列中返回0"""
+        with self._cond:
+            for index, (pending_id, _, _, _) in enumerate(self._pending):
+                if pending_id == job_id:
+                    return index + 1
+        return 0
+
+    def pending_ids(self):
+        """等待队列中的任务ID（按排队顺序）"""
+        with self._cond:
+            return [pending_id for pending_id, _, _, _ in self._pending]
+
+    @property
+    def pending_count(self):
+        with self._cond:
+            return len(self._pending)
+
+    @property
+    def running_count(self):
+        with self._cond:
+            return len(self._running)
+
+    @contextmanager
+    def stage(self, name):
+        """在阶段并发限制内执行一段代码，返回的槽位可通过 switch() 切换阶段"""
+        slot = StageSlot(self)
+        slot.switch(name)
+        try:
+            yield slot
+        finally:
+            slot.release()
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._shutdown:
+                    self._cond.wait()
+                if self._shutdown:
+                    return
+                job_id, func, args, kwargs = self._pending.popleft()
+                self._running.add(job_id)
+            if self._on_queue_change:
+                try:
+                    self._on_queue_change()
+                except Exception:
+                    traceback.print_exc()
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                with self._cond:
+                    self._running.discard(job_id)
+
+
+_STOP = object()
+
+
+class StagePipeline:
+    """分阶段的生产者/消费者流水线
+
+    stages 为 (阶段名, 处理函数, 工作线程数) 列表。处理函数接收上一阶段的输出，
+    返回值传给下一阶段；返回 None 表示该条目到此结束（例如处理失败）。
+    相邻阶段之间使用有界队列，前一阶段不会无限制地积压任务。
+    """
+
+    def __init__(self, stages, queue_size=2):
+        if not stages:
+            raise ValueError("至少需要一个阶段")
+        self.stages = [(name, func, max(1, int(workers))) for name, func, workers in stages]
+        self.queue_size = max(1, int(queue_size))
+        self._lock = threading.Lock()
+        self.stats = {}
+        self.wall_seconds = 0.0
+        self.completed = 0
+        self.feed_error = None
+
+    def run(self, items):
+        """处理全部条目，返回最后一个阶段的输出列表"""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        remaining = [workers for _, _, workers in self.stages]
+        results = []
+        self.stats = {
+            name: {'workers': workers, 'busy_seconds': 0.0, 'processed': 0, 'dropped': 0}
+            for name, _, workers in self.stages
+        }
+        self.feed_error = None
+        started = time.monotonic()
+
+        def feed():
+            # items 可能是惰性的网络列举（频道/播放列表），出错时也必须通知各阶段结束，
+            # 否则工作线程会一直阻塞在队列上
+            try:
+                for item in items:
+                    queues[0].put(item)
+            except Exception as e:
+                self.feed_error = e
+                print(f"❌ 列举待处理条目失败，已提交的条目处理完后结束: {e}")
+                traceback.print_exc()
+            finally:
+                for _ in range(self.stages[0][2]):
+                    queues[0].put(_STOP)
+
+        def work(index):
+            name, func, _ = self.stages[index]
+            stats = self.stats[name]
+            is_last = index == len(self.stages) - 1
+            while True:
+                item = queues[index].get()
+                if item is _STOP:
+                    break
+                busy_started = time.monotonic()
+                try:
+                    output = func(item)
+                except Exception:
+                    traceback.print_exc()
+                    output = None
+                with self._lock:
+                    stats['busy_seconds'] += time.monotonic() - busy_started
+                    stats['processed'] += 1
+                    if output is None:
+                        stats['dropped'] += 1
+                if output is None:
+                    continue
+                if is_last:
+                    with self._lock:
+                        results.append(output)
+                else:
+                    queues[index + 1].put(output)
+            # 本阶段最后一个工作线程退出时通知下一阶段结束
+            with self._lock:
+                remaining[index] -= 1
+                last_worker = remaining[index] == 0
+            if last_worker and not is_last:
+                for _ in range(self.stages[index + 1][2]):
+                    queues[index + 1].put(_STOP)
+
+        threads = [threading.Thread(target=feed, name="pipeline-feed", daemon=True)]
+        for index, (name, _, workers) in enumerate(self.stages):
+            for i in range(workers):
+                threads.append(threading.Thread(
+                    target=work, args=(index,), name=f"pipeline-{name}-{i + 1}", daemon=True
+                ))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.wall_seconds = time.monotonic() - started
+        self.completed = len(results)
+        return results
+
+    def summary(self):
+        """返回各阶段利用率与总吞吐量的文本摘要"""
+        wall = max(self.wall_seconds, 1e-9)
+        lines = [f"总耗时: {wall:.1f}s，完成 {self.completed} 项，"
+                 f"吞吐量: {self.completed * 3600 / wall:.1f} 个视频/小时"]
+        for name, stats in self.stats.items():
+            utilization = stats['busy_seconds'] / (wall * stats['workers'])
+            lines.append(
+                f"  - {name}: 处理 {stats['processed']} 项（失败 {stats['dropped']}），"
+                f"忙碌 {stats['busy_seconds']:.1f}s，利用率 {utilization:.0%}"
+            )
+        return "\n".join(lines)
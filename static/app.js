@@ -36,6 +36,10 @@ function initializeSocket() {
     socket.on('connect', function() {
         console.log('已连接到服务器');
         updateConnectionStatus('已连接', 'success');
+        // 重连后重新加入当前会话的房间
+        if (currentSessionId) {
+            joinSession(currentSessionId);
+        }
     });
     
     socket.on('disconnect', function() {
@@ -43,9 +47,10 @@ function initializeSocket() {
         updateConnectionStatus('已断开', 'danger');
     });
     
-    socket.on('log_message', function(data) {
+    // 服务器按会话房间批量推送日志
+    socket.on('log_batch', function(data) {
         if (!currentSessionId || data.session_id === currentSessionId) {
-            addLogMessage(data.message);
+            data.messages.forEach(message => addLogMessage(message));
         }
     });
     
@@ -55,6 +60,12 @@ function initializeSocket() {
         }
     });
     
+    socket.on('download_progress', function(data) {
+        if (data.session_id === currentSessionId) {
+            updateTransferProgress(data);
+        }
+    });
+    
     socket.on('update_complete', function(data) {
         if (data.session_id === currentSessionId) {
             handleUpdateComplete(data);
@@ -62,6 +73,17 @@ function initializeSocket() {
     });
 }
 
+// 加入会话房间，服务器确认后（或超时后）再继续
+function joinSession(sessionId) {
+    return new Promise(resolve => {
+        const timer = setTimeout(resolve, 2000);
+        socket.emit('join_session', { session_id: sessionId }, () => {
+            clearTimeout(timer);
+            resolve();
+        });
+    });
+}
+
 function bindEventListeners() {
     // 下载表单提交
     document.getElementById('download-form').addEventListener('submit', function(e) {
@@ -180,7 +202,7 @@ function updateYtdlp() {
     updateBtn.disabled = true;
     updateBtn.innerHTML = '<i class="bi bi-arrow-clockwise"></i> 更新中...';
     
-    fetch('/api/update_ytdlp', {
+    joinSession(currentSessionId).then(() => fetch('/api/update_ytdlp', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -188,7 +210,7 @@ function updateYtdlp() {
         body: JSON.stringify({
             session_id: currentSessionId
         })
-    })
+    }))
     .then(response => response.json())
     .then(data => {
         if (data.error) {
@@ -244,6 +266,9 @@ function startDownload() {
     const outputDir = document.getElementById('output-dir').value.trim();
     const cookieFile = document.getElementById('cookie-file').value.trim();
     const videoFormat = document.querySelector('input[name="video-format"]:checked').value;
+    const connections = parseInt(document.getElementById('connections').value, 10) || 1;
+    const parallelStreams = document.getElementById('parallel-streams').checked;
+    const profileJob = document.getElementById('profile-job').checked;
     
     console.log('下载参数:', {
         url: url,
@@ -278,18 +303,21 @@ function startDownload() {
         output_dir: outputDir,
         cookie_file: cookieFile,
         video_format: videoFormat,
+        connections: connections,
+        parallel_streams: parallelStreams,
+        profile: profileJob,
         session_id: currentSessionId
     };
     
     console.log('发送请求数据:', requestData);
     
-    fetch('/api/download', {
+    joinSession(currentSessionId).then(() => fetch('/api/download', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
         },
         body: JSON.stringify(requestData)
-    })
+    }))
     .then(response => {
         console.log('API响应状态:', response.status);
         if (!response.ok) {
@@ -302,8 +330,24 @@ function startDownload() {
         if (data.error) {
             throw new Error(data.error);
         }
+        if (data.status === 'syncing') {
+            addLogMessage('✓ 已开始同步频道/播放列表，新视频将逐个加入下载队列');
+            return;
+        }
+        if (data.status === 'exists') {
+            addLogMessage(`✓ 媒体库中已有该视频，无需重新下载: ${data.item.video_path}`);
+            updateProgressBar(100, '已下载', 'success');
+            resetDownloadButton();
+            return;
+        }
         currentTaskId = data.task_id;
-        addLogMessage('✓ 下载任务已启动');
+        if (data.attached) {
+            addLogMessage('✓ 相同的视频正在下载，已合并到进行中的任务');
+        } else {
+            addLogMessage(data.queue_position > 1
+                ? `✓ 下载任务已加入队列，排队位置: ${data.queue_position}`
+                : '✓ 下载任务已启动');
+        }
         addLogMessage(`任务ID: ${data.task_id}`);
     })
     .catch(error => {
@@ -316,6 +360,7 @@ function startDownload() {
 
 function updateDownloadProgress(data) {
     const statusMessages = {
+        'queued': '排队中...',
         'starting': '准备中...',
         'getting_info': '获取视频信息...',
         'downloading_video': '下载视频中...',
@@ -326,6 +371,7 @@ function updateDownloadProgress(data) {
     };
     
     const statusColors = {
+        'queued': 'secondary',
         'starting': 'info',
         'getting_info': 'info',
         'downloading_video': 'primary',
@@ -336,6 +382,7 @@ function updateDownloadProgress(data) {
     };
     
     const progressValues = {
+        'queued': 5,
         'starting': 10,
         'getting_info': 20,
         'downloading_video': 60,
@@ -345,7 +392,9 @@ function updateDownloadProgress(data) {
         'error': 0
     };
     
-    const message = statusMessages[data.status] || data.message || '处理中...';
+    const message = data.status === 'queued'
+        ? (data.message || statusMessages.queued)
+        : (statusMessages[data.status] || data.message || '处理中...');
     const color = statusColors[data.status] || 'info';
     const progress = progressValues[data.status] || 0;
     
@@ -353,6 +402,9 @@ function updateDownloadProgress(data) {
     
     if (data.status === 'completed') {
         addLogMessage(`下载完成！文件保存在: ${data.output_dir}`);
+        if (data.download_stats) {
+            addLogMessage(`下载吞吐: ${formatThroughput(data.download_stats)}`);
+        }
         resetDownloadButton();
         
         // 3秒后隐藏进度卡片
@@ -365,6 +417,25 @@ function updateDownloadProgress(data) {
     }
 }
 
+function updateTransferProgress(data) {
+    // 视频下载阶段在整体进度条中占 20% - 60%
+    if (data.percent === null || data.percent === undefined) {
+        return;
+    }
+    const progress = 20 + Math.round(data.percent * 0.4);
+    const parts = [`下载视频中 ${data.percent.toFixed(1)}%`];
+    if (data.speed) {
+        parts.push(`${formatFileSize(Math.round(data.speed))}/s`);
+    }
+    if (data.eta !== null && data.eta !== undefined) {
+        parts.push(`剩余 ${formatDuration(data.eta)}`);
+    }
+    if (data.fragment_count) {
+        parts.push(`分片 ${data.fragment_index || 0}/${data.fragment_count}`);
+    }
+    updateProgressBar(progress, parts.join(' · '), 'primary');
+}
+
 function updateProgressBar(progress, text, status) {
     const progressBar = document.getElementById('progress-bar');
     const progressText = document.getElementById('progress-text');
@@ -527,6 +598,19 @@ function formatFileSize(bytes) {
     return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
 }
 
+// 工具函数：格式化下载吞吐统计
+function formatThroughput(stats) {
+    const parts = [`${formatFileSize(stats.bytes)} / ${stats.seconds.toFixed(1)}s`];
+    if (stats.average_speed) {
+        parts.push(`平均 ${formatFileSize(stats.average_speed)}/s`);
+    }
+    if (stats.peak_speed) {
+        parts.push(`峰值 ${formatFileSize(stats.peak_speed)}/s`);
+    }
+    parts.push(`${stats.connections} 连接/流${stats.parallel_streams ? '，并行音视频流' : ''}`);
+    return parts.join(' · ');
+}
+
 // 工具函数：格式化时间
 function formatDuration(seconds) {
     const hours = Math.floor(seconds / 3600);
@@ -0,0 +1,301 @@
+"""字幕转换
+
+逐行流式解析 WebVTT 字幕并直接写出 ASS 或 SRT，不需要把整个文件读入内存：
+- 去除 <c>、<v>、行内时间戳等样式标签，<b>/<i>/<u> 转换为目标格式的对应标记
+- 根据 cue 的 line/position/align 设置生成 ASS 的 {\\anN} 对齐标签
+- 识别 YouTube 自动字幕的滚动重复行，只保留每个 cue 新出现的文字
+
+也可以作为命令行工具使用，用进程池批量转换整个媒体库目录：
+    python subtitles.py /path/to/library --format ass --workers 4
+"""
+import argparse
+import html
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+SUBTITLE_FORMATS = ('ass', 'srt')
+
+_TIMING_RE = re.compile(
+    r'^\s*((?:\d+:)?\d{1,2}:\d{2}[.,]\d{1,3})\s+-->\s+((?:\d+:)?\d{1,2}:\d{2}[.,]\d{1,3})(.*)$'
+)
+# YouTube 自动字幕中的逐词时间戳，例如 <00:00:01.520>
+_INLINE_TIMESTAMP_RE = re.compile(r'<\d{1,2}:\d{2}(?::\d{2})?[.,]\d{3}>')
+_TAG_RE = re.compile(r'</?([a-zA-Z]+)(?:\.[^\s>]*)?(?:\s[^>]*)?>')
+
+# WebVTT 样式标签到目标格式标记的映射，其余标签（c、v、lang、ruby 等）直接去除
+_STYLE_TAGS = {
+    'ass': {'b': ('{\\b1}', '{\\b0}'), 'i': ('{\\i1}', '{\\i0}'), 'u': ('{\\u1}', '{\\u0}')},
+    'srt': {'b': ('<b>', '</b>'), 'i': ('<i>', '</i>'), 'u': ('<u>', '</u>')},
+}
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+WrapStyle: 0
+ScaledBorderAndShadow: yes
+Collisions: Normal
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,20,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,2,2,2,10,10,10,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+class Cue:
+    """一条字幕：起止时间（毫秒）、原始文本行与 cue 设置"""
+    __slots__ = ('start', 'end', 'lines', 'settings')
+
+    def __init__(self, start, end, lines, settings):
+        self.start = start
+        self.end = end
+        self.lines = lines
+        self.settings = settings
+
+
+def parse_timestamp(value):
+    """把 [hh:]mm:ss.ttt 转换为毫秒"""
+    value = value.replace(',', '.')
+    clock, _, fraction = value.partition('.')
+    parts = [int(p) for p in clock.split(':')]
+    while len(parts) < 3:
+        parts.insert(0, 0)
+    hours, minutes, seconds = parts
+    millis = int(fraction.ljust(3, '0')[:3]) if fraction else 0
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000 + millis
+
+
+def _parse_settings(text):
+    settings = {}
+    for item in text.split():
+        key, sep, value = item.partition(':')
+        if sep:
+            settings[key] = value
+    return settings
+
+
+def iter_vtt_cues(lines):
+    """从文本行迭代器中逐条解析 cue（跳过头部、NOTE、STYLE、REGION 块）"""
+    in_cue = False
+    skip_block = False
+    cue = None
+    for raw in lines:
+        line = raw.rstrip('\r\n').lstrip('\ufeff')
+        # 只有空行结束 cue；YouTube 自动字幕第一个滚动 cue 的首行是单个空格，属于 cue 正文
+        if not line:
+            if cue is not None:
+                yield cue
+            cue = None
+            in_cue = skip_block = False
+            continue
+        if skip_block:
+            continue
+        if in_cue:
+            cue.lines.append(line)
+            continue
+        m = _TIMING_RE.match(line)
+        if m:
+            cue = Cue(parse_timestamp(m.group(1)), parse_timestamp(m.group(2)), [],
+                      _parse_settings(m.group(3)))
+            in_cue = True
+        elif line.startswith(('WEBVTT', 'NOTE', 'STYLE', 'REGION')):
+            skip_block = True
+        # 其他情况是 cue 标识行，忽略
+    if cue is not None:
+        yield cue
+
+
+def clean_text(text, fmt):
+    """去除 WebVTT 标签与行内时间戳，转换粗体/斜体/下划线并反转义HTML实体"""
+    if '<' not in text and '&' not in text and '{' not in text:
+        return text.strip()
+    text = _INLINE_TIMESTAMP_RE.sub('', text)
+    if fmt == 'ass':
+        # 花括号在 ASS 中表示样式块，正文中的花括号替换为圆括号
+        text = text.replace('{', '(').replace('}', ')')
+    styles = _STYLE_TAGS[fmt]
+
+    def replace_tag(m):
+        tag = m.group(1).lower()
+        if tag not in styles:
+            return ''
+        return styles[tag][1] if m.group(0).startswith('</') else styles[tag][0]
+
+    text = _TAG_RE.sub(replace_tag, text)
+    text = html.unescape(text).replace('\u200e', '').replace('\u200f', '')
+    return text.strip()
+
+
+def ass_alignment(settings):
+    """根据 cue 设置计算 ASS 的 \\an 对齐值（1-9，小键盘布局），默认底部居中返回 None"""
+    align = settings.get('align', 'center')
+    column = {'start': 0, 'left': 0, 'end': 2, 'right': 2}.get(align, 1)
+    line = settings.get('line')
+    row = 0  # 0 底部，1 中部，2 顶部
+    if line:
+        value = line.split(',')[0]
+        try:
+            if value.endswith('%'):
+                percent = float(value[:-1])
+                row = 2 if percent < 34 else (1 if percent < 67 else 0)
+            else:
+                number = int(value)
+                row = 2 if 0 <= number < 4 else 0
+        except ValueError:
+            row = 0
+    an = row * 3 + column + 1
+    return None if an == 2 else an
+
+
+def _format_ass_time(ms):
+    cs = int(round(ms / 10))
+    hours, cs = divmod(cs, 360000)
+    minutes, cs = divmod(cs, 6000)
+    seconds, cs = divmod(cs, 100)
+    return f"{hours}:{minutes:02d}:{seconds:02d}.{cs:02d}"
+
+
+def _format_srt_time(ms):
+    ms = int(ms)
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+def iter_events(cues, fmt='ass', dedupe='auto'):
+    """把 cue 转换为 (开始ms, 结束ms, 文本行列表, 对齐) 事件
+
+    dedupe='auto' 时遇到带逐词时间戳的 YouTube 自动字幕后开启滚动去重：
+    每个 cue 开头与上一个 cue 结尾相同的行被视为重复，只保留新出现的行，
+    只含重复内容的过渡 cue（通常只有10ms）会被丢弃。
+    """
+    rolling = dedupe is True
+    previous = []
+    for cue in cues:
+        if dedupe == 'auto' and not rolling:
+            rolling = any(_INLINE_TIMESTAMP_RE.search(line) for line in cue.lines)
+        lines = [clean_text(line, fmt) for line in cue.lines]
+        lines = [line for line in lines if line]
+        if rolling:
+            overlap = 0
+            for k in range(min(len(lines), len(previous)), 0, -1):
+                if lines[:k] == previous[-k:]:
+                    overlap = k
+                    break
+            previous = lines
+            lines = lines[overlap:]
+            alignment = None  # 滚动字幕的定位在去重后没有意义
+        else:
+            alignment = ass_alignment(cue.settings) if fmt == 'ass' else None
+        if lines and cue.end > cue.start:
+            yield cue.start, cue.end, lines, alignment
+
+
+def write_ass(events, out):
+    """以流式方式写出 ASS，返回事件数量"""
+    out.write(ASS_HEADER)
+    count = 0
+    for start, end, lines, alignment in events:
+        text = '\\N'.join(lines)
+        if alignment:
+            text = f"{{\\an{alignment}}}{text}"
+        out.write(f"Dialogue: 0,{_format_ass_time(start)},{_format_ass_time(end)},Default,,0,0,0,,{text}\n")
+        count += 1
+    return count
+
+
+def write_srt(events, out):
+    """以流式方式写出 SRT，返回事件数量"""
+    count = 0
+    for start, end, lines, _ in events:
+        count += 1
+        out.write(f"{count}\n{_format_srt_time(start)} --> {_format_srt_time(end)}\n")
+        out.write('\n'.join(lines))
+        out.write('\n\n')
+    return count
+
+
+def convert_vtt(vtt_path, output_path, fmt=None, dedupe='auto'):
+    """把 VTT 文件转换为 ASS 或 SRT（格式默认取输出文件扩展名），返回写出的事件数量"""
+    fmt = (fmt or os.path.splitext(output_path)[1].lstrip('.')).lower()
+    if fmt not in SUBTITLE_FORMATS:
+        raise ValueError(f"不支持的字幕格式: {fmt}")
+    writer = write_ass if fmt == 'ass' else write_srt
+    temp_path = f"{output_path}.part"
+    with open(vtt_path, 'r', encoding='utf-8-sig', errors='replace') as src, \
+            open(temp_path, 'w', encoding='utf-8', newline='\n') as dst:
+        count = writer(iter_events(iter_vtt_cues(src), fmt, dedupe), dst)
+    os.replace(temp_path, output_path)
+    return count
+
+
+def _convert_one(vtt_path, fmt, remove_source):
+    output_path = f"{os.path.splitext(vtt_path)[0]}.{fmt}"
+    count = convert_vtt(vtt_path, output_path, fmt)
+    if remove_source:
+        os.remove(vtt_path)
+    return output_path, count
+
+
+def find_vtt_files(root):
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.lower().endswith('.vtt'):
+                yield os.path.join(dirpath, filename)
+
+
+def convert_directory(root, fmt='ass', workers=None, remove_source=False, skip_existing=True):
+    """用进程池批量转换目录下所有 VTT 字幕，返回 (成功数, 失败数, 跳过数)"""
+    jobs = []
+    skipped = 0
+    for vtt_path in find_vtt_files(root):
+        if skip_existing and os.path.exists(f"{os.path.splitext(vtt_path)[0]}.{fmt}"):
+            skipped += 1
+            continue
+        jobs.append(vtt_path)
+
+    converted = failed = 0
+    if not jobs:
+        return converted, failed, skipped
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_convert_one, path, fmt, remove_source): path for path in jobs}
+        for future in as_completed(futures):
+            try:
+                output_path, count = future.result()
+                converted += 1
+                print(f"✅ {output_path} ({count} 条)")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {futures[future]}: {e}")
+    return converted, failed, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量把 VTT 字幕转换为 ASS/SRT")
+    parser.add_argument('path', help="VTT 文件或包含 VTT 文件的目录")
+    parser.add_argument('--format', choices=SUBTITLE_FORMATS, default='ass')
+    parser.add_argument('--workers', type=int, default=None, help="进程数（默认为CPU核数）")
+    parser.add_argument('--remove-source', action='store_true', help="转换成功后删除原 VTT 文件")
+    parser.add_argument('--overwrite', action='store_true', help="覆盖已存在的输出文件")
+    args = parser.parse_args(argv)
+
+    started = time.monotonic()
+    if os.path.isfile(args.path):
+        output_path, count = _convert_one(args.path, args.format, args.remove_source)
+        print(f"✅ {output_path} ({count} 条)")
+        return 0
+    converted, failed, skipped = convert_directory(
+        args.path, args.format, args.workers, args.remove_source, not args.overwrite
+    )
+    print(f"完成: 转换 {converted} 个，失败 {failed} 个，跳过 {skipped} 个，"
+          f"用时 {time.monotonic() - started:.1f}s")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -27,6 +27,9 @@ from nfo import (
     update_ytdlp,
     update_ytdlp_nightly
 )
+from manifest import write_manifest
+from catalog import get_catalog
+from emby import get_emby_notifier
 
 def save_config(config_data):
     try:
@@ -265,6 +268,19 @@ class YouTubeToEmbyApp(ctk.CTk):
         self.status_label.configure(text=message)
         self.log_message(message)
 
+    def update_progress(self, record):
+        """下载线程中的进度回调（已限流），在主线程中更新进度条"""
+        percent = record.get('percent')
+        if percent is None:
+            return
+        text = f"下载视频中 {percent:.1f}%"
+        if record.get('speed'):
+            text += f" · {record['speed'] / 1024 / 1024:.1f}MB/s"
+        if record.get('eta') is not None:
+            text += f" · 剩余 {int(record['eta'])}s"
+        self.after(0, self.progress_bar.set, percent / 100)
+        self.after(0, lambda: self.status_label.configure(text=text))
+
     def start_download(self):
         url = self.url_entry.get().strip()
         if not url:
@@ -296,6 +312,7 @@ class YouTubeToEmbyApp(ctk.CTk):
 
     def download_process(self, url, output_dir, cookie_path, video_format):
         try:
+            self.after(0, self.progress_bar.set, 0)
             # 使用nightly版本
             self.update_status("正在获取视频信息...")
             video_info = get_video_info(url, cookie_path)
@@ -307,22 +324,38 @@ class YouTubeToEmbyApp(ctk.CTk):
             video_info['cookiefile'] = cookie_path
             video_info['video_format'] = video_format
 
-            output_dir = os.path.join(output_dir, video_info['title'])
+            base_output_dir = output_dir
+            output_dir = os.path.join(base_output_dir, video_info['title'])
             os.makedirs(output_dir, exist_ok=True)
             self.update_status(f"创建输出目录: {output_dir}")
 
             self.update_status("开始下载视频...")
-            video_filename = download_video(video_info, output_dir, ytdlp_version)
+            video_filename = download_video(
+                video_info, output_dir,
+                progress_callback=self.update_progress
+            )
             if not video_filename:
                 self.update_status("视频下载失败")
                 return
 
             self.update_status("开始下载字幕...")
-            download_subtitles(video_info, output_dir, ytdlp_version)
+            download_subtitles(video_info, output_dir)
 
             self.update_status("生成元数据文件...")
             generate_metadata_files(video_info, output_dir)
-
+            try:
+                write_manifest(base_output_dir, video_info, video_info.artifacts)
+            except Exception as e:
+                self.update_status(f"写入任务清单失败: {str(e)}")
+            try:
+                get_catalog().add(base_output_dir, video_info.to_dict(), video_info.artifacts)
+            except Exception as e:
+                self.update_status(f"登记到媒体库目录失败: {str(e)}")
+            emby = get_emby_notifier()
+            if emby:
+                emby.notify(output_dir)
+
+            self.after(0, self.progress_bar.set, 1)
             self.update_status("下载完成！")
             messagebox.showinfo("成功", "文件下载和元数据生成完成！")
 